@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+import json
+import logging
+
+from aioredis import ReplyError
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_BLOCK_MS = 1000
+
+
+class Change(object):
+    """A change record read from the stream of a model that has
+    `__change_stream__ = True`.
+    op is 'save', 'delete' or 'expire' (deleted by the reaper). fields holds the stored (string) values of the
+    fields that changed in a save. version numbers the changes of a model.
+    """
+
+    def __init__(self, message_id, model, identifier, op, version, fields):
+        self.message_id = message_id
+        self.model = model
+        self.identifier = identifier
+        self.op = op
+        self.version = version
+        self.fields = fields
+
+    @classmethod
+    def from_stream(cls, message_id, fields):
+        return cls(
+            message_id=message_id,
+            model=fields['model'],
+            identifier=fields['id'],
+            op=fields['op'],
+            version=int(fields['version']),
+            fields=json.loads(fields['fields']),
+        )
+
+    def __repr__(self):
+        return '<{}: {} {}:{} v{}>'.format(self.__class__.__name__, self.op, self.model, self.identifier, self.version)
+
+
+async def create_group(db, model, group_name, latest_id='$'):
+    """Create a consumer group on the change stream of `model`, unless it
+    already exists. By default the group only sees changes made from now on,
+    use latest_id='0' to start from the oldest record still in the stream.
+    """
+    try:
+        await db.xgroup_create(model.get_stream_key(), group_name, latest_id=latest_id, mkstream=True)
+    except ReplyError as e:
+        if not str(e).startswith('BUSYGROUP'):
+            raise
+
+
+async def consume_changes(db, model, group_name, consumer_name, batch_size=DEFAULT_BATCH_SIZE,
+                          block_ms=DEFAULT_BLOCK_MS, latest_id='$'):
+    """Tail the change stream of `model` as `consumer_name` in consumer group
+    `group_name`, yielding Change objects forever.
+    A change is acknowledged when the consumer asks for the next one, and
+    changes this consumer received but never acknowledged are replayed first,
+    so delivery is at-least-once.
+    Reads block for up to block_ms, so give this its own connection.
+    Example:
+        async for change in consume_changes(db, User, 'mirror', 'worker-1'):
+            ...
+    """
+    stream_key = model.get_stream_key()
+    await create_group(db, model, group_name, latest_id=latest_id)
+    # '0' reads our pending (delivered, unacknowledged) changes, '>' new ones
+    read_id = '0'
+    while True:
+        messages = await db.xread_group(
+            group_name,
+            consumer_name,
+            [stream_key],
+            timeout=block_ms,
+            count=batch_size,
+            latest_ids=[read_id],
+        )
+        if not messages:
+            if read_id != '>':
+                logger.debug('Done replaying pending changes of {}'.format(stream_key))
+                read_id = '>'
+            continue
+        for _, message_id, fields in messages:
+            yield Change.from_stream(message_id, fields)
+            await db.xack(stream_key, group_name, message_id)
+        if read_id != '>':
+            read_id = messages[-1][1]
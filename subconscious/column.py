@@ -4,6 +4,13 @@ from datetime import datetime
 from enum import EnumMeta
 
 
+# Index types
+LEX_INDEX = 'lex'  # one lexically sorted zset per column, supports ordering
+SET_INDEX = 'set'  # one set of identifiers per distinct value, equality only
+HASH_INDEX = 'hash'  # one value -> identifier hash, used by unique columns
+INDEX_TYPES = (LEX_INDEX, SET_INDEX, HASH_INDEX)
+
+
 class InvalidColumnDefinition(Exception):
     pass
 
@@ -13,27 +20,63 @@ class Column(object):
     """
 
     def __init__(self, type=str, primary_key=None, composite_key=None, index=None,
-                 required=None, enum=None, sort=None):
+                 required=None, enum=None, sort=None, index_type=None, unique=None, search=None):
         """primary_key can exist in only a single column.
         composite_key can exist in multiple columns.
         You can't have both a primary_key and composite_key in the same model.
         index is whether you want this column indexed or not for faster retrieval.
+        index_type is how an indexed column is stored (LEX_INDEX by default).
+        SET_INDEX keeps one set per value, which is cheaper for high-cardinality
+        columns that are only ever used for exact matches.
+        unique columns are indexed with a HASH_INDEX and reject duplicate values on save.
+        search (str columns only) indexes the words of the value for full-text search.
         """
         if type not in (str, int, datetime):
             # TODO: support for other field types (uuid, etc)
             err_msg = 'Bad Field Type: {}'.format(type)
             raise InvalidColumnDefinition(err_msg)
 
+        if search and type != str:
+            err_msg = 'search is only supported on str columns'
+            raise InvalidColumnDefinition(err_msg)
+
         if primary_key and composite_key:
             err_msg = 'Column can be either primary_key or composite_key, but not both'
             raise InvalidColumnDefinition(err_msg)
 
+        if index_type is not None and index_type not in INDEX_TYPES:
+            err_msg = 'Bad index type: {}, should be one of {}'.format(index_type, INDEX_TYPES)
+            raise InvalidColumnDefinition(err_msg)
+
+        if unique:
+            if primary_key or composite_key:
+                err_msg = 'primary_key and composite_key columns are already unique'
+                raise InvalidColumnDefinition(err_msg)
+            if index_type not in (None, HASH_INDEX):
+                err_msg = 'unique columns only support {} indexes'.format(HASH_INDEX)
+                raise InvalidColumnDefinition(err_msg)
+            index, index_type = True, HASH_INDEX
+        elif index_type == HASH_INDEX:
+            err_msg = 'index_type {} requires unique=True'.format(HASH_INDEX)
+            raise InvalidColumnDefinition(err_msg)
+
+        if index_type not in (None, LEX_INDEX):
+            if not index:
+                err_msg = 'index_type {} requires index=True'.format(index_type)
+                raise InvalidColumnDefinition(err_msg)
+            if primary_key or composite_key:
+                err_msg = 'primary_key and composite_key columns only support {} indexes'.format(LEX_INDEX)
+                raise InvalidColumnDefinition(err_msg)
+
         self.field_type = type
         self.primary = primary_key is True
         self.composite = composite_key is True
         self.sorted = sort is True
+        self.unique = unique is True
+        self.search = search is True
         self.indexed = (index is True) or self.composite
         self.required = required is True or self.primary or self.composite
+        self.index_type = index_type or LEX_INDEX
 
         self.enum = enum
         if enum:
@@ -57,7 +100,9 @@ class Integer(Column):
             required=None,
             enum=None,
             sort=None,
-            auto_increment=False,):
+            auto_increment=False,
+            index_type=None,
+            unique=None,):
         super(Integer, self).__init__(
             int,
             primary_key=primary_key,
@@ -66,8 +111,13 @@ class Integer(Column):
             required=required,
             enum=enum,
             sort=sort,
+            index_type=index_type,
+            unique=unique,
         )
         self.auto_increment = auto_increment
 
+    def get_auto_key(self, model):
+        return 'auto:{}:{}'.format(model.key_prefix(), self.name)
+
     async def auto_generate(self, db, model):
-        return await db.incr('auto:{}:{}'.format(model.key_prefix(), self.name))
+        return await db.incr(self.get_auto_key(model))
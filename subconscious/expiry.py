@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+import asyncio
+import logging
+import time
+
+from aioredis import MultiExecError, WatchVariableError
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_MAX_BATCHES = 10
+DEFAULT_INTERVAL = 1.0
+# Times a batch is read again when objects change while being reaped
+WATCH_RETRIES = 5
+
+
+async def reap_expired(db, model, batch_size=DEFAULT_BATCH_SIZE, now=None):
+    """Delete up to batch_size expired objects of `model` (see
+    RedisModel.__ttl__ and save(ttl=...)) together with their index entries.
+    Objects are read with one pipeline and deleted with one transaction,
+    WATCHing them in between: if one is saved again meanwhile, the batch is
+    read again, so a refreshed object is never deleted. WATCH needs a
+    connection of its own, taken from `db` with `with await db`, so pass a
+    pool or a connection nothing else uses.
+    Returns how many objects were deleted.
+    """
+    now = time.time() if now is None else now
+    identifiers = await db.zrangebyscore(model.get_expiry_key(), max=now, offset=0, count=batch_size)
+    if not identifiers:
+        return 0
+
+    with await db as conn:
+        for _ in range(WATCH_RETRIES):
+            try:
+                expired_objects = await _delete_expired(conn, model, identifiers, now)
+                break
+            except MultiExecError as e:
+                if not any(isinstance(error, WatchVariableError) for error in e.args[-1]):
+                    raise
+                logger.debug('{} objects changed while being reaped, retrying'.format(model.__name__))
+        else:
+            return 0
+    for obj in expired_objects:
+        await model._prune_set_index_values(db, obj._set_index_values())
+    if expired_objects:
+        logger.debug('Reaped {} expired {} objects'.format(len(expired_objects), model.__name__))
+    return len(expired_objects)
+
+
+async def _delete_expired(conn, model, identifiers, now):
+    """One WATCH, read, MULTI/EXEC round of reap_expired(). Raises
+    MultiExecError if a watched object was written in between.
+    """
+    expiry_key = model.get_expiry_key()
+    await conn.watch(*[model.make_key(identifier) for identifier in identifiers])
+    try:
+        pipe = conn.pipeline()
+        futures = [(pipe.hgetall(model.make_key(identifier)), pipe.zscore(expiry_key, identifier))
+                   for identifier in identifiers]
+        await pipe.execute()
+        expired_objects, orphans = [], []
+        for identifier, (data_future, score_future) in zip(identifiers, futures):
+            data, score = await data_future, await score_future
+            if score is None or float(score) > now:
+                # saved again with a new ttl since the range was read
+                continue
+            if data:
+                expired_objects.append(model._from_redis_data(data))
+            else:
+                orphans.append(identifier)
+        if not expired_objects and not orphans:
+            await conn.unwatch()
+            return []
+
+        versions = [None] * len(expired_objects)
+        if model.__change_stream__ and expired_objects:
+            last_version = await conn.incrby(model.get_version_key(), len(expired_objects))
+            versions = range(last_version - len(expired_objects) + 1, last_version + 1)
+    except Exception:
+        await conn.unwatch()
+        raise
+    tr = conn.multi_exec()
+    for obj, version in zip(expired_objects, versions):
+        obj._queue_delete(tr, version=version, op='expire')
+    if orphans:
+        tr.zrem(expiry_key, *orphans)
+    await tr.execute()
+    return expired_objects
+
+
+async def run_reaper(db, models, interval=DEFAULT_INTERVAL, batch_size=DEFAULT_BATCH_SIZE,
+                     max_batches=DEFAULT_MAX_BATCHES):
+    """Reap expired objects of every model in `models` forever. Every
+    `interval` seconds each model gets up to max_batches batches, which caps
+    the deletion rate at max_batches * batch_size objects per model per
+    interval. Run it as a background task and cancel it to stop. `db` is
+    used as in reap_expired(), so give it a pool or its own connection.
+    Example:
+        reaper = asyncio.ensure_future(run_reaper(db, [Session, Quote]))
+    """
+    while True:
+        for model in models:
+            for _ in range(max_batches):
+                try:
+                    if await reap_expired(db, model, batch_size=batch_size) < batch_size:
+                        break
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    logger.exception('Failed to reap expired {} objects'.format(model.__name__))
+                    break
+        await asyncio.sleep(interval)
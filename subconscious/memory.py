@@ -0,0 +1,682 @@
+#!/usr/bin/env python3
+
+import asyncio
+import fnmatch
+import functools
+import itertools
+import time
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+
+from aioredis import MultiExecError, ReplyError, WatchVariableError
+
+
+WRONGTYPE = 'WRONGTYPE Operation against a key holding the wrong kind of value'
+SCAN_DEFAULT_COUNT = 10
+# same values as aioredis' Redis.ZSET_EXCLUDE_* flags
+ZSET_EXCLUDE_MIN = 'ZSET_EXCLUDE_MIN'
+ZSET_EXCLUDE_MAX = 'ZSET_EXCLUDE_MAX'
+ZSET_EXCLUDE_BOTH = 'ZSET_EXCLUDE_BOTH'
+
+
+def _to_str(value):
+    if isinstance(value, bytes):
+        return value.decode()
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+class _SortedSet(object):
+    """Members ordered by (score, member) like a redis zset. The utf-8 encoding
+    of every member is kept next to it so lex ranges compare bytes like redis.
+    """
+
+    def __init__(self):
+        self.scores = {}
+        self.entries = []
+
+    def __len__(self):
+        return len(self.scores)
+
+    def add(self, score, member):
+        old = self.scores.get(member)
+        if old is not None:
+            if old == score:
+                return 0
+            self.remove(member)
+        self.scores[member] = score
+        insort(self.entries, (score, member.encode(), member))
+        return int(old is None)
+
+    def remove(self, member):
+        score = self.scores.pop(member, None)
+        if score is None:
+            return 0
+        del self.entries[bisect_left(self.entries, (score, member.encode()))]
+        return 1
+
+    def lex_range(self, min, max, include_min=True, include_max=True):
+        # lex ranges are only defined when all members share a score, as in redis
+        if not self.entries:
+            return []
+        score = self.entries[0][0]
+        if min == b'-':
+            start = 0
+        else:
+            start = bisect_left(self.entries, (score, min if include_min else min + b'\x00'))
+        if max == b'+':
+            stop = len(self.entries)
+        else:
+            stop = bisect_left(self.entries, (score, max + b'\x00' if include_max else max))
+        return self.entries[start:stop]
+
+    def score_range(self, min, max, exclude=None):
+        exclude_min = exclude in (ZSET_EXCLUDE_MIN, ZSET_EXCLUDE_BOTH)
+        exclude_max = exclude in (ZSET_EXCLUDE_MAX, ZSET_EXCLUDE_BOTH)
+        start = bisect_left(self.entries, (min, ))
+        while exclude_min and start < len(self.entries) and self.entries[start][0] == min:
+            start += 1
+        entries = []
+        for entry in self.entries[start:]:
+            if entry[0] > max or (exclude_max and entry[0] == max):
+                break
+            entries.append(entry)
+        return entries
+
+
+class _Stream(object):
+
+    def __init__(self):
+        self.entries = []
+        self.last_id = (0, 0)
+        self.groups = {}
+
+    def next_id(self):
+        ms = int(time.time() * 1000)
+        if ms > self.last_id[0]:
+            self.last_id = (ms, 0)
+        else:
+            self.last_id = (self.last_id[0], self.last_id[1] + 1)
+        return self.last_id
+
+    def after(self, stream_id, count=None):
+        index = bisect_left(self.entries, (stream_id, ))
+        while index < len(self.entries) and self.entries[index][0] <= stream_id:
+            index += 1
+        entries = self.entries[index:]
+        return entries[:count] if count else entries
+
+
+def _parse_stream_id(value):
+    value = _to_str(value)
+    if value == '-':
+        return (0, 0)
+    if value == '+':
+        return (float('inf'), float('inf'))
+    ms, _, seq = value.partition('-')
+    return (int(ms), int(seq) if seq else 0)
+
+
+def _format_stream_id(stream_id):
+    return '{}-{}'.format(*stream_id)
+
+
+def _format_messages(entries):
+    return [(_format_stream_id(stream_id), OrderedDict(fields)) for stream_id, fields in entries]
+
+
+class _Pipeline(object):
+    """Buffers commands and runs them back to back on execute(). Nothing
+    else can run on the event loop in between, so this doubles as MULTI/EXEC.
+    """
+
+    def __init__(self, db, watched=None):
+        self._db = db
+        self._commands = []
+        self._watched = watched or {}
+
+    def __getattr__(self, name):
+        method = getattr(self._db, name)
+
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            future = asyncio.get_event_loop().create_future()
+            self._commands.append((future, method, args, kwargs))
+            return future
+        return wrapper
+
+    async def execute(self, *, return_exceptions=False):
+        if any(self._db._versions.get(key) != version for key, version in self._watched.items()):
+            # like EXEC replying nil, nothing runs
+            error = WatchVariableError('WATCH variable has changed')
+            for future, _, _, _ in self._commands:
+                future.set_exception(error)
+            raise MultiExecError([error] * len(self._commands))
+        results, error = [], None
+        for future, method, args, kwargs in self._commands:
+            try:
+                result = await method(*args, **kwargs)
+            except ReplyError as exc:
+                error = error or exc
+                future.set_exception(exc)
+                result = exc
+            else:
+                future.set_result(result)
+            results.append(result)
+        if error is not None and not return_exceptions:
+            raise error
+        return results
+
+
+class _Connection(object):
+    """A MemoryRedis seen through one connection, as returned by
+    `with await db as conn:`. The data is shared, WATCHed keys are not: a
+    multi_exec() of this connection fails if any of them was written since.
+    """
+
+    def __init__(self, db):
+        self._db = db
+        self._watched = {}
+
+    def __getattr__(self, name):
+        return getattr(self._db, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._watched = {}
+
+    async def watch(self, key, *keys):
+        for k in (key, ) + keys:
+            self._watched.setdefault(_to_str(k), self._db._versions.get(_to_str(k)))
+        return True
+
+    async def unwatch(self):
+        self._watched = {}
+        return True
+
+    def multi_exec(self):
+        # EXEC always forgets the watched keys
+        watched, self._watched = self._watched, {}
+        return _Pipeline(self._db, watched=watched)
+
+
+class MemoryRedis(object):
+    """Embedded, pure-python stand-in for an aioredis connection created with
+    encoding='utf-8': replies are str and everything lives in process memory.
+    It implements the subset of commands used by RedisModel and the
+    subconscious helpers, with redis semantics, so it can be passed anywhere
+    a `db` is expected. Commands never wait on I/O, which also makes
+    pipelines and MULTI/EXEC blocks atomic.
+    Example:
+        db = MemoryRedis()
+        await User(uuid='1', name='John Doe').save(db)
+    """
+
+    def __init__(self):
+        self._data = {}
+        # sorted snapshot of the keys SCAN walks, taken when a scan starts
+        # after keys were added or removed
+        self._scan_keys = []
+        self._keys_changed = False
+        self._stream_waiters = set()
+        # key -> number of the last write to it, for WATCH
+        self._versions = {}
+        self._writes = itertools.count(1)
+
+    def __await__(self):
+        # `with await db as conn:` gives a connection of its own, as with aioredis
+        return _Connection(self)
+        yield
+
+    def _touch(self, *keys):
+        write = next(self._writes)
+        for key in keys:
+            self._versions[_to_str(key)] = write
+
+    def _get(self, key, kind, create=False):
+        key = _to_str(key)
+        value = self._data.get(key)
+        if value is None:
+            if not create:
+                return None
+            value = kind()
+            self._put(key, value)
+        elif not isinstance(value, kind):
+            raise ReplyError(WRONGTYPE)
+        return value
+
+    def _put(self, key, value):
+        if key not in self._data:
+            self._keys_changed = True
+        self._data[key] = value
+
+    def _pop(self, key):
+        value = self._data.pop(key, None)
+        if value is not None:
+            self._keys_changed = True
+        return value
+
+    def _prune(self, key):
+        key = _to_str(key)
+        if not self._data[key] and not isinstance(self._data[key], _Stream):
+            self._pop(key)
+
+    # generic
+
+    async def exists(self, key, *keys):
+        return sum(1 for k in (key, ) + keys if _to_str(k) in self._data)
+
+    async def delete(self, key, *keys):
+        self._touch(key, *keys)
+        return sum(1 for k in (key, ) + keys if self._pop(_to_str(k)) is not None)
+
+    async def type(self, key):
+        value = self._data.get(_to_str(key))
+        return {
+            type(None): 'none',
+            str: 'string',
+            dict: 'hash',
+            set: 'set',
+            _SortedSet: 'zset',
+            _Stream: 'stream',
+        }[type(value)]
+
+    async def scan(self, cursor=0, match=None, count=None):
+        # Keys are walked in sorted order and the cursor encodes the last key
+        # passed, so keys present for the whole scan are returned exactly once.
+        # A snapshot taken by a later scan still holds all of those, so
+        # scans in progress can carry on in it.
+        cursor = int(cursor)
+        if not cursor and self._keys_changed:
+            self._scan_keys, self._keys_changed = sorted(self._data), False
+        last_key = cursor.to_bytes((cursor.bit_length() + 7) // 8, 'big')[1:].decode() if cursor else None
+        start = bisect_right(self._scan_keys, last_key) if last_key is not None else 0
+        end = start + (count or SCAN_DEFAULT_COUNT)
+        page = [k for k in self._scan_keys[start:end] if k in self._data]
+        next_cursor = int.from_bytes(b'\x01' + self._scan_keys[end - 1].encode(), 'big') \
+            if end < len(self._scan_keys) else 0
+        if match is not None:
+            page = [k for k in page if fnmatch.fnmatchcase(k, _to_str(match))]
+        return next_cursor, page
+
+    async def iscan(self, *, match=None, count=None):
+        cursor = None
+        while cursor != 0:
+            cursor, keys = await self.scan(cursor or 0, match=match, count=count)
+            for key in keys:
+                yield key
+
+    async def eval(self, script, keys=[], args=[]):
+        # Lua can't run here, callers fall back to plain commands as they
+        # would on a server with scripting disabled
+        raise ReplyError("ERR unknown command 'EVAL'")
+
+    async def sort(self, key, *get_patterns, by=None, offset=None, count=None, asc=None, alpha=False, store=None):
+        value = self._data.get(_to_str(key))
+        if value is None:
+            elements = []
+        elif isinstance(value, _SortedSet):
+            elements = [entry[2] for entry in value.entries]
+        elif isinstance(value, set):
+            elements = sorted(value)
+        else:
+            raise ReplyError(WRONGTYPE)
+
+        by = _to_str(by) if by is not None else None
+        if by != 'nosort':
+            def weight(element):
+                raw = element if by is None else self._lookup(by, element)
+                if alpha:
+                    return (raw is not None, raw or '')
+                try:
+                    return float(raw or 0)
+                except ValueError:
+                    raise ReplyError("ERR One or more scores can't be converted into double")
+            elements = sorted(elements, key=weight, reverse=(asc is not None and asc is not True))
+        if offset is not None and count is not None:
+            elements = elements[offset:offset + count]
+        if get_patterns:
+            elements = [self._lookup(_to_str(pattern), element) for element in elements for pattern in get_patterns]
+        if store is not None:
+            raise ReplyError('ERR SORT STORE is not supported')
+        return elements
+
+    def _lookup(self, pattern, element):
+        if pattern == '#':
+            return element
+        key, _, field = pattern.replace('*', element, 1).partition('->')
+        value = self._data.get(key)
+        if field:
+            return value.get(field) if isinstance(value, dict) else None
+        return value if isinstance(value, str) else None
+
+    # strings
+
+    async def get(self, key):
+        return self._get(key, str)
+
+    async def set(self, key, value):
+        self._touch(key)
+        self._put(_to_str(key), _to_str(value))
+        return True
+
+    async def incr(self, key):
+        return await self.incrby(key, 1)
+
+    async def incrby(self, key, increment):
+        self._touch(key)
+        try:
+            value = int(self._get(key, str) or 0) + increment
+        except ValueError:
+            raise ReplyError('ERR value is not an integer or out of range')
+        self._put(_to_str(key), str(value))
+        return value
+
+    # hashes
+
+    async def hgetall(self, key):
+        return dict(self._get(key, dict) or {})
+
+    async def hget(self, key, field):
+        return (self._get(key, dict) or {}).get(_to_str(field))
+
+    async def hmget(self, key, field, *fields):
+        value = self._get(key, dict) or {}
+        return [value.get(_to_str(f)) for f in (field, ) + fields]
+
+    async def hlen(self, key):
+        return len(self._get(key, dict) or {})
+
+    async def hset(self, key, field, value):
+        self._touch(key)
+        value_map = self._get(key, dict, create=True)
+        field = _to_str(field)
+        created = field not in value_map
+        value_map[field] = _to_str(value)
+        return int(created)
+
+    async def hsetnx(self, key, field, value):
+        self._touch(key)
+        value_map = self._get(key, dict, create=True)
+        field = _to_str(field)
+        if field in value_map:
+            return 0
+        value_map[field] = _to_str(value)
+        return 1
+
+    async def hmset_dict(self, key, *args, **kwargs):
+        self._touch(key)
+        pairs = dict(args[0]) if args else {}
+        pairs.update(kwargs)
+        if not pairs:
+            raise TypeError('args or kwargs must not be empty')
+        value_map = self._get(key, dict, create=True)
+        value_map.update({_to_str(k): _to_str(v) for k, v in pairs.items()})
+        return True
+
+    async def hdel(self, key, field, *fields):
+        self._touch(key)
+        value_map = self._get(key, dict)
+        if value_map is None:
+            return 0
+        removed = sum(1 for f in (field, ) + fields if value_map.pop(_to_str(f), None) is not None)
+        self._prune(key)
+        return removed
+
+    async def hincrby(self, key, field, increment=1):
+        self._touch(key)
+        value_map = self._get(key, dict, create=True)
+        field = _to_str(field)
+        value_map[field] = str(int(value_map.get(field, 0)) + increment)
+        return int(value_map[field])
+
+    # sets
+
+    async def sadd(self, key, member, *members):
+        self._touch(key)
+        value = self._get(key, set, create=True)
+        before = len(value)
+        value.update(_to_str(m) for m in (member, ) + members)
+        return len(value) - before
+
+    async def srem(self, key, member, *members):
+        self._touch(key)
+        value = self._get(key, set)
+        if value is None:
+            return 0
+        before = len(value)
+        value.difference_update(_to_str(m) for m in (member, ) + members)
+        removed = before - len(value)
+        self._prune(key)
+        return removed
+
+    async def smembers(self, key):
+        return list(self._get(key, set) or ())
+
+    async def sismember(self, key, member):
+        return int(_to_str(member) in (self._get(key, set) or ()))
+
+    async def scard(self, key):
+        return len(self._get(key, set) or ())
+
+    async def sinter(self, key, *keys):
+        sets = [self._get(k, set) or set() for k in (key, ) + keys]
+        return list(set.intersection(*sets))
+
+    async def sunion(self, key, *keys):
+        sets = [self._get(k, set) or set() for k in (key, ) + keys]
+        return list(set.union(*sets))
+
+    # sorted sets
+
+    async def zadd(self, key, score, member, *pairs):
+        self._touch(key)
+        value = self._get(key, _SortedSet, create=True)
+        items = (score, member) + pairs
+        return sum(value.add(float(items[i]), _to_str(items[i + 1])) for i in range(0, len(items), 2))
+
+    async def zrem(self, key, member, *members):
+        self._touch(key)
+        value = self._get(key, _SortedSet)
+        if value is None:
+            return 0
+        removed = sum(value.remove(_to_str(m)) for m in (member, ) + members)
+        self._prune(key)
+        return removed
+
+    async def zcard(self, key):
+        return len(self._get(key, _SortedSet) or ())
+
+    async def zscore(self, key, member):
+        value = self._get(key, _SortedSet)
+        return value.scores.get(_to_str(member)) if value is not None else None
+
+    async def zrange(self, key, start=0, stop=-1, withscores=False):
+        value = self._get(key, _SortedSet)
+        entries = value.entries if value is not None else []
+        if start < 0:
+            start = max(len(entries) + start, 0)
+        if stop < 0:
+            stop = len(entries) + stop
+        return self._format_zset_reply(entries[start:stop + 1], withscores)
+
+    async def zrangebylex(self, key, min=b'-', max=b'+', include_min=True, include_max=True, offset=None, count=None):
+        if not isinstance(min, bytes) or not isinstance(max, bytes):
+            raise TypeError('min and max arguments must be bytes')
+        value = self._get(key, _SortedSet)
+        entries = value.lex_range(min, max, include_min, include_max) if value is not None else []
+        return self._format_zset_reply(self._limit(entries, offset, count), False)
+
+    async def zlexcount(self, key, min=b'-', max=b'+', include_min=True, include_max=True):
+        value = self._get(key, _SortedSet)
+        return len(value.lex_range(min, max, include_min, include_max)) if value is not None else 0
+
+    async def zrangebyscore(self, key, min=float('-inf'), max=float('inf'), withscores=False, offset=None, count=None,
+                            *, exclude=None):
+        value = self._get(key, _SortedSet)
+        entries = value.score_range(min, max, exclude) if value is not None else []
+        return self._format_zset_reply(self._limit(entries, offset, count), withscores)
+
+    @staticmethod
+    def _limit(entries, offset, count):
+        if offset is None:
+            return entries
+        return entries[offset:] if count < 0 else entries[offset:offset + count]
+
+    @staticmethod
+    def _format_zset_reply(entries, withscores):
+        if withscores:
+            return [(entry[2], entry[0]) for entry in entries]
+        return [entry[2] for entry in entries]
+
+    # streams
+
+    async def xadd(self, stream, fields, message_id=b'*', max_len=None, exact_len=False):
+        self._touch(stream)
+        value = self._get(stream, _Stream, create=True)
+        if _to_str(message_id) == '*':
+            stream_id = value.next_id()
+        else:
+            stream_id = _parse_stream_id(message_id)
+            if stream_id <= value.last_id:
+                raise ReplyError('ERR The ID specified in XADD is equal or smaller than the target stream top item')
+            value.last_id = stream_id
+        value.entries.append((stream_id, tuple((_to_str(k), _to_str(v)) for k, v in fields.items())))
+        if max_len is not None and len(value.entries) > max_len:
+            del value.entries[:len(value.entries) - max_len]
+        for waiter in self._stream_waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+        return _format_stream_id(stream_id)
+
+    async def xlen(self, stream):
+        value = self._get(stream, _Stream)
+        return len(value.entries) if value is not None else 0
+
+    async def xrange(self, stream, start='-', stop='+', count=None):
+        value = self._get(stream, _Stream)
+        if value is None:
+            return []
+        start, stop = _parse_stream_id(start), _parse_stream_id(stop)
+        entries = [entry for entry in value.entries if start <= entry[0] <= stop]
+        return _format_messages(entries[:count] if count else entries)
+
+    async def xrevrange(self, stream, start='+', stop='-', count=None):
+        value = self._get(stream, _Stream)
+        if value is None:
+            return []
+        start, stop = _parse_stream_id(start), _parse_stream_id(stop)
+        entries = [entry for entry in reversed(value.entries) if stop <= entry[0] <= start]
+        return _format_messages(entries[:count] if count else entries)
+
+    async def xread(self, streams, timeout=0, count=None, latest_ids=None):
+        latest_ids = latest_ids or ['$'] * len(streams)
+        positions = []
+        for stream, latest_id in zip(streams, latest_ids):
+            if _to_str(latest_id) == '$':
+                value = self._get(stream, _Stream)
+                positions.append(value.last_id if value is not None else (0, 0))
+            else:
+                positions.append(_parse_stream_id(latest_id))
+
+        def read():
+            result = []
+            for stream, position in zip(streams, positions):
+                value = self._get(stream, _Stream)
+                if value is not None:
+                    for message_id, fields in _format_messages(value.after(position, count)):
+                        result.append((_to_str(stream), message_id, fields))
+            return result
+        return await self._block(read, timeout)
+
+    async def xgroup_create(self, stream, group_name, latest_id='$', mkstream=False):
+        value = self._get(stream, _Stream, create=mkstream)
+        if value is None:
+            raise ReplyError('ERR The XGROUP subcommand requires the key to exist')
+        group_name = _to_str(group_name)
+        if group_name in value.groups:
+            raise ReplyError('BUSYGROUP Consumer Group name already exists')
+        last_id = value.last_id if _to_str(latest_id) == '$' else _parse_stream_id(latest_id)
+        value.groups[group_name] = {'last_id': last_id, 'pending': OrderedDict()}
+        return True
+
+    async def xread_group(self, group_name, consumer_name, streams, timeout=0, count=None, latest_ids=None,
+                          no_ack=False):
+        latest_ids = latest_ids or ['>'] * len(streams)
+        groups = []
+        for stream in streams:
+            value = self._get(stream, _Stream)
+            group = value.groups.get(_to_str(group_name)) if value is not None else None
+            if group is None:
+                raise ReplyError('NOGROUP No such key or consumer group in XREADGROUP with GROUP option')
+            groups.append((value, group))
+
+        def read():
+            result = []
+            for stream, latest_id, (value, group) in zip(streams, latest_ids, groups):
+                if _to_str(latest_id) == '>':
+                    entries = value.after(group['last_id'], count)
+                    if entries:
+                        group['last_id'] = entries[-1][0]
+                    if not no_ack:
+                        group['pending'].update((entry[0], _to_str(consumer_name)) for entry in entries)
+                else:
+                    # replay this consumer's pending (delivered but unacknowledged) entries
+                    position = _parse_stream_id(latest_id)
+                    entries = [
+                        entry for entry in value.entries
+                        if entry[0] > position and group['pending'].get(entry[0]) == _to_str(consumer_name)
+                    ][:count or None]
+                for message_id, fields in _format_messages(entries):
+                    result.append((_to_str(stream), message_id, fields))
+            return result
+        if any(_to_str(latest_id) != '>' for latest_id in latest_ids):
+            return read()
+        return await self._block(read, timeout)
+
+    async def xack(self, stream, group_name, id, *ids):
+        value = self._get(stream, _Stream)
+        group = value.groups.get(_to_str(group_name)) if value is not None else None
+        if group is None:
+            return 0
+        return sum(1 for i in (id, ) + ids if group['pending'].pop(_parse_stream_id(i), None) is not None)
+
+    async def _block(self, read, timeout):
+        result = read()
+        deadline = None if not timeout else time.monotonic() + timeout / 1000
+        while not result and timeout is not None:
+            waiter = asyncio.get_event_loop().create_future()
+            self._stream_waiters.add(waiter)
+            try:
+                await asyncio.wait_for(waiter, None if deadline is None else max(deadline - time.monotonic(), 0))
+            except asyncio.TimeoutError:
+                return []
+            finally:
+                self._stream_waiters.discard(waiter)
+            result = read()
+        return result
+
+    # transactions
+
+    def pipeline(self):
+        return _Pipeline(self)
+
+    def multi_exec(self):
+        return _Pipeline(self)
+
+    # connection
+
+    async def flushdb(self):
+        self._touch(*self._data.keys())
+        self._data.clear()
+        self._keys_changed = True
+        return True
+
+    def close(self):
+        pass
+
+    async def wait_closed(self):
+        pass
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+
+import asyncio
+import copy
+import logging
+
+from .model import InvalidModelDefinition, InvalidQuery, LEX_LOOKUPS, LOOKUP_SEPARATOR, MODEL_NAME_ID_SEPARATOR, tokenize
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_BLOCK_MS = 1000
+
+
+class ModelMirror(object):
+    """Read-only, in-process replica of every object of a model, for small and
+    read-hot models (reference data, config tables).
+    start() loads the model once with SCAN and then follows its change
+    stream, so the model needs `__change_stream__ = True`. load(), filter_by()
+    and all() mirror the RedisModel API but are answered from local memory.
+    Writes still go through save()/delete() and show up here once the
+    change is read from the stream.
+    The follower blocks on XREAD, so give the mirror a pool or its own
+    connection.
+    Example:
+        countries = ModelMirror(Country, db)
+        await countries.start()
+        usa = await countries.load('USA')
+    """
+
+    def __init__(self, model, db, batch_size=DEFAULT_BATCH_SIZE, block_ms=DEFAULT_BLOCK_MS):
+        if not model.__change_stream__:
+            err_msg = '{} needs __change_stream__ = True to be mirrored'.format(model.__name__)
+            raise InvalidModelDefinition(err_msg)
+        self._model = model
+        self._db = db
+        self._batch_size = batch_size
+        self._block_ms = block_ms
+        self._objects = {}
+        # column name -> str(value) -> identifiers, for every queryable column
+        self._indexes = {name: {} for name in model._queryable_colnames_set | model._composite_column_names}
+        self._last_id = None
+        # version of the last change record read, to notice records trimmed off the stream unread
+        self._last_version = None
+        self._task = None
+
+    def __len__(self):
+        return len(self._objects)
+
+    async def start(self):
+        """Load every object, then keep following the change stream in the
+        background until stop().
+        """
+        await self.resync()
+        self._task = asyncio.ensure_future(self._follow())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def resync(self):
+        """(Re)load every object from redis.
+        """
+        db, model = self._db, self._model
+        # Changes recorded after this point are replayed on top of the scan,
+        # so nothing written while scanning is lost
+        last_messages = await db.xrevrange(model.get_stream_key(), count=1)
+        last_id = last_messages[0][0] if last_messages else '0-0'
+        last_version = int(last_messages[0][1]['version']) if last_messages else None
+
+        objects = {}
+        keys = []
+        async for key in db.iscan(match='{}{}*'.format(model.key_prefix(), MODEL_NAME_ID_SEPARATOR),
+                                  count=self._batch_size):
+            keys.append(key)
+            if len(keys) == self._batch_size:
+                objects.update(await self._fetch(keys, by_key=True))
+                keys = []
+        objects.update(await self._fetch(keys, by_key=True))
+
+        self._objects = {}
+        self._indexes = {name: {} for name in self._indexes}
+        for obj in objects.values():
+            if obj is not None:
+                self._add(obj)
+        self._last_id = last_id
+        self._last_version = last_version
+        await self.sync()
+
+    async def sync(self):
+        """Apply every change recorded so far, without waiting for new ones.
+        """
+        while await self._apply_changes(timeout=None):
+            pass
+
+    async def _follow(self):
+        while True:
+            try:
+                await self._apply_changes(timeout=self._block_ms)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception('Failed to follow changes of {}'.format(self._model.get_stream_key()))
+                await asyncio.sleep(self._block_ms / 1000)
+
+    async def _apply_changes(self, timeout):
+        messages = await self._db.xread(
+            [self._model.get_stream_key()],
+            timeout=timeout,
+            count=self._batch_size,
+            latest_ids=[self._last_id],
+        )
+        if not messages:
+            return 0
+        # Versions are consecutive, so a gap means the stream was capped past
+        # records this replica never read. Records written by racing savers
+        # can also arrive out of order, which only costs a needless resync.
+        versions = [int(fields['version']) for _, _, fields in messages]
+        if self._last_version is not None and min(versions) > self._last_version + 1:
+            logger.warning('{} skipped from version {} to {}, resyncing'.format(
+                self._model.get_stream_key(), self._last_version, min(versions)))
+            await self.resync()
+            return 0
+        # only the latest op per object matters, saves are re-read as a whole
+        ops = {}
+        for _, _, fields in messages:
+            ops[fields['id']] = fields['op']
+        saved = [identifier for identifier, op in ops.items() if op == 'save']
+        objects = await self._fetch(saved)
+        for identifier in ops:
+            self._remove(identifier)
+            if objects.get(identifier) is not None:
+                self._add(objects[identifier])
+        self._last_id = messages[-1][1]
+        self._last_version = max(versions + [self._last_version or 0])
+        return len(messages)
+
+    async def _fetch(self, keys, by_key=False):
+        """Pipelined HGETALL of identifiers (or redis keys), None for the
+        ones that are gone.
+        """
+        if not keys:
+            return {}
+        pipe = self._db.pipeline()
+        futures = [pipe.hgetall(key if by_key else self._model.make_key(key)) for key in keys]
+        await pipe.execute()
+        objects = {}
+        for key, future in zip(keys, futures):
+            data = await future
+            objects[key] = self._model._from_redis_data(data) if data else None
+        return objects
+
+    def _add(self, obj):
+        identifier = obj.identifier()
+        self._objects[identifier] = obj
+        for name, index in self._indexes.items():
+            index.setdefault(str(getattr(obj, name)), set()).add(identifier)
+
+    def _remove(self, identifier):
+        obj = self._objects.pop(identifier, None)
+        if obj is None:
+            return
+        for name, index in self._indexes.items():
+            value = str(getattr(obj, name))
+            index[value].discard(identifier)
+            if not index[value]:
+                del index[value]
+
+    async def load(self, identifier):
+        """Like RedisModel.load(), returns a copy so the replica can't be
+        modified by accident.
+        """
+        obj = self._objects.get(str(identifier))
+        return copy.copy(obj) if obj is not None else None
+
+    async def all(self, order_by=None, limit=None, offset=None):
+        async for x in self.filter_by(order_by=order_by, limit=limit, offset=offset):
+            yield x
+
+    async def filter_by(self, offset=None, limit=None, order_by=None, _search=None, **kwargs):
+        """Like RedisModel.filter_by(), including the LEX_LOOKUPS, answered
+        from local memory. order_by sorts on the stored strings, as redis
+        does (so int columns sort alphabetically), with unset values first.
+        Without order_by, results are sorted by identifier.
+        """
+        model = self._model
+        if order_by:
+            direction = order_by[0] == '-'
+            order_by = order_by.lstrip('+-')
+            if order_by not in model._queryable_colnames_set:
+                err_msg = 'order_by field {order_by} is not in {queryable_cols}'.format(
+                    order_by=order_by,
+                    queryable_cols=model._queryable_colnames_set,
+                )
+                raise InvalidQuery(err_msg)
+        # same validation as RedisModel.filter_by()
+        equality_kwargs, _ = model._parse_lex_lookups(kwargs)
+        missing_cols_set = set(equality_kwargs.keys()) - set(self._indexes.keys())
+        if missing_cols_set:
+            err_msg = '{missing_cols_set} not in {queryable_cols}'.format(
+                missing_cols_set=missing_cols_set,
+                queryable_cols=model._queryable_colnames_set,
+            )
+            raise InvalidQuery(err_msg)
+
+        result_set = None
+        for k, v in equality_kwargs.items():
+            if v is None:
+                v = model._columns_map[k]
+            values = v if isinstance(v, (list, tuple)) else (v, )
+            index = self._indexes[k]
+            temp_set = set().union(*[index.get(str(value), ()) for value in values])
+            result_set = temp_set if result_set is None else result_set & temp_set
+        if result_set is None:
+            result_set = set(self._objects.keys())
+        if _search is not None:
+            if not model._search_column_names:
+                raise InvalidQuery('{} has no search columns'.format(model.__name__))
+            tokens = tokenize(_search)
+            result_set = {x for x in result_set if tokens and tokens <= self._objects[x].search_tokens()}
+        for key, value in kwargs.items():
+            column_name, _, lookup = key.rpartition(LOOKUP_SEPARATOR)
+            if key in equality_kwargs or lookup not in LEX_LOOKUPS:
+                continue
+            result_set = {x for x in result_set if _matches(getattr(self._objects[x], column_name), lookup, value)}
+
+        if order_by:
+            # like SORT ... ALPHA in redis: on the stored strings, unset values first
+            def sort_key(identifier):
+                obj = self._objects[identifier]
+                if not obj.has_real_data(order_by):
+                    return (False, '')
+                return (True, model._index_value(getattr(obj, order_by)))
+            ids_to_iterate = sorted(sorted(result_set), key=sort_key, reverse=direction)
+        else:
+            ids_to_iterate = sorted(result_set)
+        offset = offset or 0
+        ids_to_iterate = ids_to_iterate[offset:offset + limit] if limit else ids_to_iterate[offset:]
+
+        for identifier in ids_to_iterate:
+            yield copy.copy(self._objects[identifier])
+
+    async def get_object_or_none(self, **kwargs):
+        async for obj in self.filter_by(limit=1, **kwargs):
+            return obj
+        return None
+
+
+def _matches(value, lookup, operand):
+    if not isinstance(value, str):
+        return False
+    if lookup == 'startswith':
+        return value.startswith(operand)
+    if lookup == 'gt':
+        return value > operand
+    if lookup == 'gte':
+        return value >= operand
+    if lookup == 'lt':
+        return value < operand
+    return value <= operand
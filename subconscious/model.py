@@ -1,11 +1,19 @@
 #!/usr/bin/env python3
 
+import asyncio
 import inspect
+import itertools
+import json
 import logging
+import re
+import time
 import uuid
+from collections import Counter, deque
 from datetime import datetime
 
-from .column import Column
+from aioredis import ReplyError
+
+from .column import Column, HASH_INDEX, SET_INDEX
 from .query import Query
 
 
@@ -14,6 +22,70 @@ logger = logging.getLogger(__name__)
 VALUE_ID_SEPARATOR = '\x00'
 MODEL_NAME_ID_SEPARATOR = ':'
 DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+LOOKUP_SEPARATOR = '__'
+SEARCH_TOKEN_RE = re.compile(r'\w+')
+# Lookups answered by a ZRANGEBYLEX over a LEX_INDEX, e.g. filter_by(name__startswith='Jo')
+LEX_LOOKUPS = ('startswith', 'gt', 'gte', 'lt', 'lte')
+# Page size used when streaming ids out of an index
+FILTER_BATCH_SIZE = 100
+AGGREGATE_FUNCTIONS = ('count', 'min', 'max', 'sum', 'avg')
+# Reduces columns over the objects of one index without sending them to the client.
+# KEYS[1] is a set of identifiers (ARGV[1] == 'set') or a lex index read between
+# ARGV[2] and ARGV[3]. Then come the hash key prefix and (column, is int) pairs.
+# Returns count, sum, min and max per column, min and max as stored.
+AGGREGATE_SCRIPT = '''
+local ids, offset = {}, 2
+if ARGV[1] == 'set' then
+    ids = redis.call('SMEMBERS', KEYS[1])
+else
+    for i, entry in ipairs(redis.call('ZRANGEBYLEX', KEYS[1], ARGV[2], ARGV[3])) do
+        ids[i] = string.sub(entry, string.find(entry, '\\0', 1, true) + 1)
+    end
+    offset = 4
+end
+local prefix, fields, numeric, stats = ARGV[offset], {}, {}, {}
+for i = offset + 1, #ARGV, 2 do
+    fields[#fields + 1] = ARGV[i]
+    numeric[#numeric + 1] = ARGV[i + 1] == '1'
+    stats[#stats + 1] = {count = 0, sum = 0}
+end
+for _, id in ipairs(ids) do
+    local values = redis.call('HMGET', prefix .. id, unpack(fields))
+    for i, raw in ipairs(values) do
+        if raw then
+            local stat, value = stats[i], raw
+            if numeric[i] then
+                value = tonumber(raw)
+                stat.sum = stat.sum + value
+            end
+            stat.count = stat.count + 1
+            if stat.min == nil or value < stat.min then
+                stat.min, stat.min_raw = value, raw
+            end
+            if stat.max == nil or value > stat.max then
+                stat.max, stat.max_raw = value, raw
+            end
+        end
+    end
+end
+local reply = {}
+for i, stat in ipairs(stats) do
+    reply[#reply + 1] = tostring(stat.count)
+    reply[#reply + 1] = numeric[i] and string.format('%d', stat.sum) or false
+    reply[#reply + 1] = stat.min_raw or false
+    reply[#reply + 1] = stat.max_raw or false
+end
+return reply
+'''
+# Loads the object a unique index maps ARGV[1] to in one round trip: HGET from
+# the index KEYS[1], then HGETALL of the hash key prefix ARGV[2] .. identifier.
+GET_BY_UNIQUE_SCRIPT = '''
+local identifier = redis.call('HGET', KEYS[1], ARGV[1])
+if not identifier then
+    return {}
+end
+return redis.call('HGETALL', ARGV[2] .. identifier)
+'''
 
 
 # Exceptions
@@ -34,6 +106,32 @@ class UnexpectedColumnError(Exception):
     pass
 
 
+class UniqueConstraintError(Exception):
+    pass
+
+
+class _LazyField(object):
+    """Non-data descriptor ModelMeta puts in front of every Column. Values
+    set on an instance live in its __dict__ and win, as before. Objects
+    loaded lazily keep the raw redis hash instead, and each field is decoded
+    and validated the first time it is read. Anything else gets the Column.
+    """
+
+    def __init__(self, column):
+        self.column = column
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self.column
+        raw = instance.__dict__.get('_raw')
+        if raw is None or self.column.name not in raw:
+            return self.column
+        value = owner._decode_field(self.column.name, raw[self.column.name])
+        instance._check_value(self.column, value)
+        instance.__dict__[self.column.name] = value
+        return value
+
+
 class ModelMeta(type):
 
     def __init__(cls, what, bases=None, attributes=None):
@@ -81,52 +179,94 @@ class ModelMeta(type):
             cls._sortable_column_names = tuple([x.name for x in cls._sortable_columns])
             cls._auto_column_names = {col.name for col in cls._auto_columns}
             cls._indexed_column_names = {col.name for col in cls._indexed_columns}
+            cls._set_indexed_column_names = {col.name for col in cls._indexed_columns if col.index_type == SET_INDEX}
+            cls._unique_column_names = {col.name for col in cls._indexed_columns if col.index_type == HASH_INDEX}
             cls._columns_map = {c.name: c for c in cls._columns}
             cls._identifier_column_names = tuple([x.name for x in cls._identifier_columns])
+            for column in cls._columns:
+                setattr(cls, column.name, _LazyField(column))
+
+            cls._composite_indexes = tuple(tuple(x) for x in cls.__indexes__)
+            for column_names in cls._composite_indexes:
+                if len(column_names) < 2 or len(set(column_names)) != len(column_names):
+                    err_msg = 'Composite index {} in {} needs two or more distinct columns'.format(
+                        column_names, cls.__name__)
+                    raise InvalidModelDefinition(err_msg)
+                unknown_columns = set(column_names) - set(cls._columns_map.keys())
+                if unknown_columns:
+                    err_msg = 'Composite index {} in {} has unknown columns {}'.format(
+                        column_names, cls.__name__, unknown_columns)
+                    raise InvalidModelDefinition(err_msg)
+            cls._composite_column_names = {name for x in cls._composite_indexes for name in x}
+            cls._search_column_names = tuple([col.name for col in cls._columns if col.search])
 
 
 class RedisModel(object, metaclass=ModelMeta):
 
+    # Append a change record to a per-model redis stream on every save/delete,
+    # see subconscious.changes for reading it
+    __change_stream__ = False
+    # Approximate (MAXLEN ~) cap on the number of records kept in that stream
+    __change_stream_maxlen__ = 10000
+    # Default time to live of saved objects, in seconds. Expired objects are
+    # deleted with their index entries by subconscious.expiry's reaper
+    __ttl__ = None
+    # Composite indexes, each a tuple of column names, e.g. [('country_code', 'gender', 'status')].
+    # Queries on a prefix of one are answered by a single ZRANGEBYLEX
+    __indexes__ = ()
+    # Decode the fields of loaded objects on first access instead of in load(),
+    # see load(lazy=...)
+    __lazy__ = False
+
     # force only keyword arguments
     def __init__(self, **kwargs):
         loading = kwargs.pop('loading', False)
         for column in self._columns:
             if column.name in kwargs:
-                value = kwargs.pop(column.name)
-                if type(value) != column.field_type:
-                    err_msg = "Column `{}` in {} has value {}, should be of type {}".format(
-                        column.name,
-                        self.__class__.__name__,
-                        value,
-                        column.field_type,
-                    )
-                    raise BadDataError(err_msg)
-
-                if column.enum_choices and value not in column.enum_choices:
-                    err_msg = "Column `{}` in {} has value {}, should be in set {}".format(
-                        column.name,
-                        self.__class__.__name__,
-                        value,
-                        column.enum_choices,
-                    )
-                    raise BadDataError(err_msg)
+                value = kwargs[column.name]
+                self._check_value(column, value)
                 if getattr(column, 'auto_increment', False) and not loading:
                     err_msg = "Not allowed to set auto_increment column({})".format(column.name)
                     raise BadDataError(err_msg)
 
                 self.__dict__.update({column.name: value})
-            else:
-                if column.required and not getattr(column, 'auto_increment', False):
-                    err_msg = 'Missing column `{}` in `{}` is required'.format(
-                        column.name,
-                        self.__class__.__name__,
-                    )
-                    raise BadDataError(err_msg)
+        self._check_column_names(kwargs.keys())
+
+    def _check_value(self, column, value):
+        if type(value) != column.field_type:
+            err_msg = "Column `{}` in {} has value {}, should be of type {}".format(
+                column.name,
+                self.__class__.__name__,
+                value,
+                column.field_type,
+            )
+            raise BadDataError(err_msg)
+
+        if column.enum_choices and value not in column.enum_choices:
+            err_msg = "Column `{}` in {} has value {}, should be in set {}".format(
+                column.name,
+                self.__class__.__name__,
+                value,
+                column.enum_choices,
+            )
+            raise BadDataError(err_msg)
+
+    def _check_column_names(self, column_names):
+        """Every required column is supplied and nothing else.
+        """
+        supplied_cols_set = set(column_names)
+        for column in self._columns:
+            if column.name not in supplied_cols_set and column.required and \
+                    not getattr(column, 'auto_increment', False):
+                err_msg = 'Missing column `{}` in `{}` is required'.format(
+                    column.name,
+                    self.__class__.__name__,
+                )
+                raise BadDataError(err_msg)
 
         # Require that every kwarg supplied matches an expected column
         # TODO: handle TimeStampedModel cols better
         known_cols_set = set([column.name for column in self._columns] + ['updated_at', 'created_at'])
-        supplied_cols_set = set([x for x in kwargs])
         unknown_cols_set = supplied_cols_set - known_cols_set
         if unknown_cols_set != set():
             err_msg = 'Unknown column(s): {} in `{}`'.format(
@@ -135,6 +275,15 @@ class RedisModel(object, metaclass=ModelMeta):
             )
             raise UnexpectedColumnError(err_msg)
 
+    def _hydrate(self):
+        """Decode every field still raw in a lazily loaded object.
+        """
+        if '_raw' not in self.__dict__:
+            return
+        for column in self._columns:
+            getattr(self, column.name)
+        del self.__dict__['_raw']
+
     def __setattr__(self, name, value):
         if name in self._auto_column_names:
             err_msg = "Not allowed to set auto_increment column({})".format(name)
@@ -174,6 +323,7 @@ class RedisModel(object, metaclass=ModelMeta):
         # WARNING: we have to send a copy, otherwise changing the dict
         # changes the object!
         # FIXME: this returns no keys for keys whose value is None!
+        self._hydrate()
         return self.__dict__.copy()
 
     def __repr__(self):
@@ -183,26 +333,191 @@ class RedisModel(object, metaclass=ModelMeta):
     def get_index_key(cls, column_name):
         return 'index{}{}{}{}'.format(MODEL_NAME_ID_SEPARATOR, cls.key_prefix(), MODEL_NAME_ID_SEPARATOR, column_name)
 
+    @classmethod
+    def get_stream_key(cls):
+        """Key of the stream holding this model's change records.
+        """
+        return 'changes{}{}'.format(MODEL_NAME_ID_SEPARATOR, cls.key_prefix())
+
+    @classmethod
+    def get_version_key(cls):
+        """Key of the counter numbering this model's change records.
+        """
+        return 'version{}{}'.format(MODEL_NAME_ID_SEPARATOR, cls.key_prefix())
+
+    @classmethod
+    def get_expiry_key(cls):
+        """Key of the sorted set of identifiers scored by expiry timestamp.
+        """
+        return 'expiry{}{}'.format(MODEL_NAME_ID_SEPARATOR, cls.key_prefix())
+
+    @classmethod
+    def get_set_index_key(cls, column_name, value):
+        """Key of the set holding the identifiers of every object whose
+        `column_name` is `value`. Only used for SET_INDEX columns.
+        """
+        return '{}{}{}'.format(cls.get_index_key(column_name), MODEL_NAME_ID_SEPARATOR, cls._index_value(value))
+
+    @classmethod
+    def get_set_index_values_key(cls, column_name):
+        """Key of the set of values a SET_INDEX column has an identifier set
+        for, so they can be listed without scanning the keyspace.
+        """
+        return cls.get_index_key(column_name)
+
+    @classmethod
+    async def _prune_set_index_values(cls, db, column_values):
+        """Drop the (column name, value) pairs whose identifier set is now
+        empty from the value registries. A save that refills the set in the
+        meantime is caught by checking again, so no live value is dropped.
+        """
+        for column_name, value in column_values:
+            set_index_key = cls.get_set_index_key(column_name, value)
+            if await db.scard(set_index_key):
+                continue
+            await db.srem(cls.get_set_index_values_key(column_name), cls._index_value(value))
+            if await db.scard(set_index_key):
+                await db.sadd(cls.get_set_index_values_key(column_name), cls._index_value(value))
+
+    def _set_index_values(self):
+        return [(column_name, getattr(self, column_name)) for column_name in sorted(self._set_indexed_column_names)]
+
+    @classmethod
+    def get_composite_index_key(cls, column_names):
+        return cls.get_index_key('+'.join(column_names))
+
+    def _composite_index_entry(self, column_names):
+        """`value1\x00value2\x00...\x00identifier`, so entries sort by the
+        columns in order and any prefix of them is a lex range.
+        """
+        values = [self._index_value(getattr(self, name)) for name in column_names]
+        return VALUE_ID_SEPARATOR.join(values + [self.identifier()])
+
+    @classmethod
+    def get_search_key(cls, token):
+        """Key of the set holding the identifiers of every object with
+        `token` in one of its search columns.
+        """
+        return 'search{}{}{}{}'.format(MODEL_NAME_ID_SEPARATOR, cls.key_prefix(), MODEL_NAME_ID_SEPARATOR, token)
+
+    def search_tokens(self):
+        """The distinct words of all the search columns of this object.
+        """
+        tokens = set()
+        for column_name in self._search_column_names:
+            if self.has_real_data(column_name):
+                tokens.update(tokenize(getattr(self, column_name)))
+        return tokens
+
     async def save_index(self, db, stale_object=None):
+        if self._search_column_names:
+            tokens = self.search_tokens()
+            stale_tokens = stale_object.search_tokens() if stale_object else set()
+            # only the words that changed, in one round trip
+            if tokens != stale_tokens:
+                pipe = db.pipeline()
+                for token in stale_tokens - tokens:
+                    pipe.srem(self.get_search_key(token), stale_object.identifier())
+                for token in tokens - stale_tokens:
+                    pipe.sadd(self.get_search_key(token), self.identifier())
+                await pipe.execute()
+        for column_names in self._composite_indexes:
+            index_key = self.get_composite_index_key(column_names)
+            if stale_object:
+                await db.zrem(index_key, stale_object._composite_index_entry(column_names))
+            await db.zadd(index_key, 0, self._composite_index_entry(column_names))
         for indexed_column in self._queryable_colnames_set:
+            if indexed_column in self._set_indexed_column_names:
+                value = getattr(self, indexed_column)
+                await db.sadd(self.get_set_index_key(indexed_column, value), self.identifier())
+                await db.sadd(self.get_set_index_values_key(indexed_column), self._index_value(value))
+                if stale_object:
+                    stale_value = getattr(stale_object, indexed_column)
+                    if self._index_value(stale_value) != self._index_value(value):
+                        await db.srem(self.get_set_index_key(indexed_column, stale_value), stale_object.identifier())
+                        await self._prune_set_index_values(db, [(indexed_column, stale_value)])
+                continue
+            if indexed_column in self._unique_column_names:
+                # unique columns map value -> identifier in a hash, see _claim_unique_values()
+                index_key = self.get_index_key(indexed_column)
+                if stale_object and stale_object.has_real_data(indexed_column):
+                    stale_value = self._index_value(getattr(stale_object, indexed_column))
+                    if stale_value != self._index_value(getattr(self, indexed_column)) and \
+                            await db.hget(index_key, stale_value) == stale_object.identifier():
+                        await db.hdel(index_key, stale_value)
+                if self.has_real_data(indexed_column):
+                    await db.hset(index_key, self._index_value(getattr(self, indexed_column)), self.identifier())
+                continue
             index_key = self.get_index_key(indexed_column)
             if stale_object:
                 stale_index_value = '{}{}{}'.format(
-                    getattr(stale_object, indexed_column),
+                    self._index_value(getattr(stale_object, indexed_column)),
                     VALUE_ID_SEPARATOR,
                     stale_object.identifier()
                 )
                 await db.zrem(index_key, stale_index_value)
             index_value = '{}{}{}'.format(
-                getattr(self, indexed_column),
+                self._index_value(getattr(self, indexed_column)),
                 VALUE_ID_SEPARATOR,
                 self.identifier()
             )
             # Index it by adding to a sorted set with 0 score. It will be lexically sorted by redis
             await db.zadd(index_key, 0, index_value,)
 
-    async def save(self, db):
+    def _queue_index(self, tr):
+        """Queue on a pipeline or transaction the commands adding this
+        object's index entries. Unlike save_index(), nothing stale is removed
+        and unique values are not checked, which suits bulk loads.
+        """
+        identifier = self.identifier()
+        for column_names in self._composite_indexes:
+            tr.zadd(self.get_composite_index_key(column_names), 0, self._composite_index_entry(column_names))
+        for token in self.search_tokens():
+            tr.sadd(self.get_search_key(token), identifier)
+        for column_name in self._queryable_colnames_set:
+            value = getattr(self, column_name)
+            if column_name in self._set_indexed_column_names:
+                tr.sadd(self.get_set_index_key(column_name, value), identifier)
+                tr.sadd(self.get_set_index_values_key(column_name), self._index_value(value))
+            elif column_name in self._unique_column_names:
+                if self.has_real_data(column_name):
+                    tr.hset(self.get_index_key(column_name), self._index_value(value), identifier)
+            else:
+                tr.zadd(self.get_index_key(column_name), 0, '{}{}{}'.format(
+                    self._index_value(value), VALUE_ID_SEPARATOR, identifier))
+
+    async def _claim_unique_values(self, db, stale_object=None):
+        """Reserve the values of every unique column for this object. HSETNX
+        makes the reservation atomic, so two objects racing for the same value
+        can't both win. Raises UniqueConstraintError (releasing anything
+        reserved so far) if a value already belongs to another object.
+        """
+        claimed = []
+        for column_name in sorted(self._unique_column_names):
+            if not self.has_real_data(column_name):
+                continue
+            value = self._index_value(getattr(self, column_name))
+            if stale_object and stale_object.has_real_data(column_name) and \
+                    self._index_value(getattr(stale_object, column_name)) == value:
+                continue
+            index_key = self.get_index_key(column_name)
+            if await db.hsetnx(index_key, value, self.identifier()):
+                claimed.append((index_key, value))
+            elif await db.hget(index_key, value) != self.identifier():
+                for claimed_key, claimed_value in claimed:
+                    await db.hdel(claimed_key, claimed_value)
+                err_msg = 'Column `{}` in {} has value {}, which already exists'.format(
+                    column_name,
+                    self.__class__.__name__,
+                    value,
+                )
+                raise UniqueConstraintError(err_msg)
+
+    async def save(self, db, ttl=None):
         """Save the object to Redis.
+        ttl (seconds) overrides the model's __ttl__, 0 means no expiry. Models
+        without __ttl__ only touch expiries when ttl is passed, so use ttl=0
+        to keep an object that was saved with one.
         """
         kwargs = {}
         for col in self._auto_columns:
@@ -212,48 +527,184 @@ class RedisModel(object, metaclass=ModelMeta):
 
         # we have to delete the old index key
         stale_object = await self.__class__.load(db, identifier=self.identifier())
-        d = {
+        if self._unique_column_names:
+            await self._claim_unique_values(db, stale_object=stale_object)
+        d = self._to_redis_data()
+        ttl = self.__ttl__ if ttl is None else ttl
+        if self.__change_stream__ or ttl is not None:
+            version = await db.incr(self.get_version_key()) if self.__change_stream__ else None
+            # the object, its change record and its expiry are written in one transaction
+            tr = db.multi_exec()
+            hmset_future = tr.hmset_dict(self.redis_key(), d)
+            if self.__change_stream__:
+                stale_data = stale_object._to_redis_data() if stale_object else {}
+                changed = {k: str(v) for k, v in d.items() if k not in stale_data or str(v) != str(stale_data[k])}
+                self._queue_change(tr, 'save', version, changed)
+            if ttl:
+                tr.zadd(self.get_expiry_key(), time.time() + ttl, self.identifier())
+            elif ttl is not None:
+                tr.zrem(self.get_expiry_key(), self.identifier())
+            await tr.execute()
+            success = await hmset_future
+        else:
+            success = await db.hmset_dict(self.redis_key(), d)
+        await self.save_index(db, stale_object=stale_object)
+        return success
+
+    def _to_redis_data(self):
+        """The hash this object is stored as.
+        """
+        self._hydrate()
+        return {
             k: (v.strftime(DATETIME_FORMAT) if isinstance(v, datetime) else v)
             for k, v in self.__dict__.items()
         }
-        success = await db.hmset_dict(self.redis_key(), d)
-        await self.save_index(db, stale_object=stale_object)
-        return success
+
+    def _queue_change(self, tr, op, version, fields):
+        """Queue the XADD of a change record on a pipeline or transaction.
+        """
+        tr.xadd(
+            self.get_stream_key(),
+            {
+                'model': self.key_prefix(),
+                'id': self.identifier(),
+                'op': op,
+                'version': version,
+                'fields': json.dumps(fields, sort_keys=True),
+            },
+            max_len=self.__change_stream_maxlen__,
+        )
+
+    def _queue_delete(self, tr, version=None, op='delete'):
+        """Queue on a pipeline or transaction everything needed to remove
+        this object, as stored in redis, together with its index entries.
+        `version` is required when the model has a change stream.
+        """
+        identifier = self.identifier()
+        for column_names in self._composite_indexes:
+            tr.zrem(self.get_composite_index_key(column_names), self._composite_index_entry(column_names))
+        for token in self.search_tokens():
+            tr.srem(self.get_search_key(token), identifier)
+        for column_name in self._queryable_colnames_set:
+            value = getattr(self, column_name)
+            if column_name in self._set_indexed_column_names:
+                tr.srem(self.get_set_index_key(column_name, value), identifier)
+            elif column_name in self._unique_column_names:
+                # save() only lets one object hold a unique value, so it is ours to drop
+                if self.has_real_data(column_name):
+                    tr.hdel(self.get_index_key(column_name), self._index_value(value))
+            else:
+                tr.zrem(self.get_index_key(column_name), '{}{}{}'.format(
+                    self._index_value(value), VALUE_ID_SEPARATOR, identifier))
+        tr.delete(self.redis_key())
+        tr.zrem(self.get_expiry_key(), identifier)
+        if self.__change_stream__:
+            self._queue_change(tr, op, version, {})
+
+    async def delete(self, db):
+        """Delete the object and its index entries from Redis, in one
+        transaction. Returns False if it wasn't there.
+        """
+        # the index entries to remove are those of the stored version, not of self
+        stored_object = await self.__class__.load(db, identifier=self.identifier())
+        if stored_object is None:
+            return False
+        version = await db.incr(self.get_version_key()) if self.__change_stream__ else None
+        tr = db.multi_exec()
+        stored_object._queue_delete(tr, version=version)
+        await tr.execute()
+        await self._prune_set_index_values(db, stored_object._set_index_values())
+        return True
 
     async def exists(self, db):
         return await db.exists(self.redis_key())
 
     @classmethod
-    async def load(cls, db, identifier=None, redis_key=None):
+    async def load(cls, db, identifier=None, redis_key=None, lazy=None):
         """Load the object from redis. Use the identifier (colon-separated
         composite keys or the primary key) or the redis_key.
+        lazy (the model's __lazy__ by default) keeps the raw values and decodes
+        each field on first access, so a BadDataError may surface then.
         """
         if not identifier and not redis_key:
             raise InvalidQuery('Must supply identifier or redis_key')
         if redis_key is None:
             redis_key = cls.make_key(identifier)
-        if await db.exists(redis_key):
-            data = await db.hgetall(redis_key)
-            kwargs = {}
-            for key_bin, value_bin in data.items():
-                key, value = key_bin, value_bin
-                column = getattr(cls, key, False)
-                if not column or (column.field_type == str):
-                    kwargs[key] = value
-                elif column.field_type == datetime:
-                    kwargs[key] = datetime.strptime(value, DATETIME_FORMAT)
-                else:
-                    kwargs[key] = column.field_type(value)
-            kwargs['loading'] = True
-            return cls(**kwargs)
+        # HGETALL of a missing key is empty, so there is no need for an EXISTS round trip
+        data = await db.hgetall(redis_key)
+        if data:
+            return cls._from_redis_data(data, lazy=cls.__lazy__ if lazy is None else lazy)
         else:
             logger.debug("No Redis key found: {}".format(redis_key))
             return None
 
     @classmethod
-    async def all(cls, db, order_by=None, limit=None, offset=None):
-        async for x in cls.filter_by(db, order_by=order_by, limit=limit, offset=offset):
-            yield x
+    def _from_redis_data(cls, data, lazy=False):
+        """Build an object from the raw hash stored in redis.
+        """
+        if lazy:
+            obj = cls.__new__(cls)
+            obj._check_column_names(data.keys())
+            obj.__dict__['_raw'] = data
+            return obj
+        kwargs = {key: cls._decode_field(key, value) for key, value in data.items()}
+        kwargs['loading'] = True
+        return cls(**kwargs)
+
+    @classmethod
+    def _decode_field(cls, key, value):
+        """Convert a raw hash field from redis to the column's python type.
+        """
+        column = getattr(cls, key, False)
+        if not column or (column.field_type == str):
+            return value
+        elif column.field_type == datetime:
+            return datetime.strptime(value, DATETIME_FORMAT)
+        else:
+            return column.field_type(value)
+
+    @classmethod
+    async def get_by_unique(cls, db, **kwargs):
+        """Fetch the object whose unique column has the given value, or None.
+        This skips the generic filter_by() machinery entirely: one EVAL does
+        the index lookup and the HGETALL.
+        Example:
+            User.get_by_unique(db, email='guido@python.org')
+        """
+        if len(kwargs) != 1:
+            raise InvalidQuery('get_by_unique takes exactly one unique column')
+        (column_name, value), = kwargs.items()
+        if column_name not in cls._unique_column_names:
+            err_msg = '{} not in {}'.format(column_name, cls._unique_column_names)
+            raise InvalidQuery(err_msg)
+        index_key = cls.get_index_key(column_name)
+        try:
+            reply = await db.eval(
+                GET_BY_UNIQUE_SCRIPT,
+                keys=[index_key],
+                args=[cls._index_value(value), '{}{}'.format(cls.key_prefix(), MODEL_NAME_ID_SEPARATOR)],
+            )
+        except ReplyError as e:
+            if 'unknown command' not in str(e).lower():
+                raise
+            # no scripting (e.g. MemoryRedis), so two round trips
+            identifier = await db.hget(index_key, cls._index_value(value))
+            if identifier is None:
+                return None
+            return await cls.load(db, identifier=identifier)
+        if not reply:
+            return None
+        data = dict(zip(reply[::2], reply[1::2]))
+        return cls._from_redis_data(data, lazy=cls.__lazy__)
+
+    @classmethod
+    async def all(cls, db, order_by=None, limit=None, offset=None, prefetch=None):
+        results = cls.filter_by(db, order_by=order_by, limit=limit, offset=offset, prefetch=prefetch)
+        try:
+            async for x in results:
+                yield x
+        finally:
+            await results.aclose()
 
     @classmethod
     async def _get_ordered_result(cls, db, list_to_order, order_by, direction):
@@ -286,7 +737,7 @@ class RedisModel(object, metaclass=ModelMeta):
             return []
 
     @classmethod
-    async def _get_ids_filter_by(cls, db, order_by=None, **kwargs):
+    async def _get_ids_filter_by(cls, db, order_by=None, _search=None, **kwargs):
         if order_by:
             direction = b'DESC' if order_by[0] == '-' else None
             if order_by[0] in ('+', '-'):
@@ -298,36 +749,79 @@ class RedisModel(object, metaclass=ModelMeta):
                     )
                     raise InvalidQuery(err_msg)
 
-        missing_cols_set = set(kwargs.keys()) - cls._queryable_colnames_set
+        kwargs, lex_ranges = cls._parse_lex_lookups(kwargs)
+        result_set = set()
+        first_iteration = True
+        composite_index, prefix_length = cls._match_composite_index(kwargs)
+        if composite_index:
+            kwargs = dict(kwargs)
+            values_per_column = [cls._lookup_values(name, kwargs.pop(name)) for name in composite_index[:prefix_length]]
+            for values in itertools.product(*values_per_column):
+                prefix = ''.join(value + VALUE_ID_SEPARATOR for value in values)
+                result_set.update(x.rpartition(VALUE_ID_SEPARATOR)[2] for x in await db.zrangebylex(
+                    cls.get_composite_index_key(composite_index),
+                    min=prefix.encode(),
+                    max=prefix.encode() + b'\xff'))
+            first_iteration = False
+
+        missing_cols_set = (set(kwargs.keys()) | set(lex_ranges.keys())) - cls._queryable_colnames_set
         if missing_cols_set:
             err_msg = '{missing_cols_set} not in {queryable_cols}'.format(
                 missing_cols_set=missing_cols_set,
                 queryable_cols=cls._queryable_colnames_set,
             )
             raise InvalidQuery(err_msg)
-        result_set = set()
-        first_iteration = True
+        # single-value lookups on SET_INDEX columns and search tokens are intersected by redis (SINTER) in one go
+        set_index_keys = []
+        if _search is not None:
+            if not cls._search_column_names:
+                raise InvalidQuery('{} has no search columns'.format(cls.__name__))
+            tokens = tokenize(_search)
+            if not tokens:
+                # nothing to look for matches nothing
+                result_set, first_iteration = set(), False
+            set_index_keys.extend(cls.get_search_key(token) for token in sorted(tokens))
         for k, v in kwargs.items():
-            if v is None:
-                v = cls._columns_map[k]
-            if isinstance(v, (list, tuple)):
-                values = [str(x) for x in v]
-            elif isinstance(v, datetime):
-                values = (v.strftime(DATETIME_FORMAT),)
+            values = cls._lookup_values(k, v)
+            if k in cls._unique_column_names:
+                temp_set = set(x for x in await db.hmget(cls.get_index_key(k), *values) if x is not None) \
+                    if values else set()
+            elif k in cls._set_indexed_column_names:
+                keys = [cls.get_set_index_key(k, value) for value in values]
+                if len(keys) == 1:
+                    set_index_keys.extend(keys)
+                    continue
+                temp_set = set(await db.sunion(*keys)) if keys else set()
             else:
-                values = (str(v),)
-            temp_set = set()
-            for value in values:
-                temp_set = temp_set.union({x.partition(VALUE_ID_SEPARATOR)[2] for x in await db.zrangebylex(
-                    cls.get_index_key(k),
-                    min='{}{}'.format(value, VALUE_ID_SEPARATOR).encode(),
-                    max='{}{}\xff'.format(value, VALUE_ID_SEPARATOR).encode())})
+                temp_set = set()
+                for value in values:
+                    temp_set = temp_set.union({x.partition(VALUE_ID_SEPARATOR)[2] for x in await db.zrangebylex(
+                        cls.get_index_key(k),
+                        min='{}{}'.format(value, VALUE_ID_SEPARATOR).encode(),
+                        max='{}{}\xff'.format(value, VALUE_ID_SEPARATOR).encode())})
             if first_iteration:
                 result_set = result_set.union(temp_set)
                 first_iteration = False
             else:
                 result_set = result_set.intersection(temp_set)
-        if not kwargs:
+        if set_index_keys:
+            temp_set = set(await db.sinter(*set_index_keys))
+            if first_iteration:
+                result_set = temp_set
+                first_iteration = False
+            else:
+                result_set = result_set.intersection(temp_set)
+        for k, (lex_min, lex_max) in lex_ranges.items():
+            temp_set = set()
+            for range_min, range_max in cls._exclude_unset_entries(k, lex_min, lex_max):
+                temp_set.update(x.partition(VALUE_ID_SEPARATOR)[2] for x in await db.zrangebylex(
+                    cls.get_index_key(k), min=range_min, max=range_max))
+            if first_iteration:
+                result_set = temp_set
+                first_iteration = False
+            else:
+                result_set = result_set.intersection(temp_set)
+        if first_iteration:
             for index_entry in await db.zrange(cls.get_index_key(cls._identifier_column_names[0]), 0, -1):
                 result_set.add(index_entry.split(VALUE_ID_SEPARATOR)[-1])
         if order_by:
@@ -336,17 +830,184 @@ class RedisModel(object, metaclass=ModelMeta):
         return sorted(result_set)
 
     @classmethod
-    async def filter_by(cls, db, offset=None, limit=None, **kwargs):
+    def _lookup_values(cls, column_name, value):
+        """The index values an equality filter on `column_name` matches.
+        None matches unset values, a list or tuple any of its values.
+        """
+        if value is None:
+            value = cls._columns_map[column_name]
+        if isinstance(value, (list, tuple)):
+            return [cls._index_value(x) for x in value]
+        return [cls._index_value(value)]
+
+    @classmethod
+    def _index_value(cls, value):
+        """`value` as written in index entries and keys, datetimes as they
+        are stored.
+        """
+        if isinstance(value, datetime):
+            return value.strftime(DATETIME_FORMAT)
+        return str(value)
+
+    @classmethod
+    def _match_composite_index(cls, kwargs):
+        """The composite index with the longest prefix of columns covered by
+        the equality filters in kwargs and the length of that prefix, or
+        (None, 0). A one column prefix is only used when that column has no
+        index of its own.
+        """
+        best, best_length = None, 0
+        for column_names in cls._composite_indexes:
+            length = 0
+            while length < len(column_names) and column_names[length] in kwargs:
+                length += 1
+            if length == 1 and column_names[0] in cls._queryable_colnames_set:
+                continue
+            if length > best_length:
+                best, best_length = column_names, length
+        return best, best_length
+
+    @classmethod
+    def _parse_lex_lookups(cls, kwargs):
+        """Split `column__lookup` filters (see LEX_LOOKUPS) out of kwargs.
+        Returns the remaining equality filters and a dict of column name to the
+        inclusive (min, max) ZRANGEBYLEX bounds matching all of its lookups.
+        """
+        equality_kwargs, lex_ranges = {}, {}
+        for key, value in kwargs.items():
+            column_name, separator, lookup = key.rpartition(LOOKUP_SEPARATOR)
+            if not separator or lookup not in LEX_LOOKUPS:
+                equality_kwargs[key] = value
+                continue
+            column = cls._columns_map.get(column_name)
+            if column is None or column_name not in cls._queryable_colnames_set or \
+                    column_name in cls._set_indexed_column_names | cls._unique_column_names or \
+                    column.field_type != str:
+                err_msg = '{} lookups need a str column with a lexical index, got {}'.format(lookup, column_name)
+                raise InvalidQuery(err_msg)
+            if not isinstance(value, str):
+                err_msg = '{} lookup on {} needs a str value, got {}'.format(lookup, column_name, value)
+                raise InvalidQuery(err_msg)
+
+            # Index entries are `value\x00identifier` and utf-8 never contains \xff,
+            # so these inclusive bounds select exactly the matching values
+            value = value.encode()
+            separator = VALUE_ID_SEPARATOR.encode()
+            lex_min, lex_max = {
+                'startswith': (value + separator, value + b'\xff'),
+                'gt': (value + separator + b'\xff', b'+'),
+                'gte': (value + separator, b'+'),
+                'lt': (b'-', value),
+                'lte': (b'-', value + separator + b'\xff'),
+            }[lookup]
+            if column_name in lex_ranges:
+                current_min, current_max = lex_ranges[column_name]
+                if current_min != b'-' and (lex_min == b'-' or current_min > lex_min):
+                    lex_min = current_min
+                if current_max != b'+' and (lex_max == b'+' or current_max < lex_max):
+                    lex_max = current_max
+            lex_ranges[column_name] = (lex_min, lex_max)
+        return equality_kwargs, lex_ranges
+
+    @classmethod
+    def _exclude_unset_entries(cls, column_name, lex_min, lex_max):
+        """Objects without a value are indexed under the column placeholder
+        (`<Column: name>`), which a lookup must not match. Returns the inclusive
+        ZRANGEBYLEX ranges covering (lex_min, lex_max) minus those entries.
+        """
+        unset_value = str(cls._columns_map[column_name]).encode()
+        # Neither bound can be a member: members always contain the separator
+        # right after the value, and never contain \xff
+        unset_min, unset_max = unset_value, unset_value + VALUE_ID_SEPARATOR.encode() + b'\xff'
+        if (lex_min != b'-' and lex_min > unset_max) or (lex_max != b'+' and lex_max < unset_min):
+            return [(lex_min, lex_max)]
+        ranges = []
+        if lex_min == b'-' or lex_min < unset_min:
+            ranges.append((lex_min, unset_min))
+        if lex_max == b'+' or lex_max > unset_max:
+            ranges.append((unset_max, lex_max))
+        return ranges
+
+    @classmethod
+    async def _iter_ids_by_lex_range(cls, db, column_name, lex_min, lex_max, offset=None, limit=None):
+        """Stream the identifiers in a LEX_INDEX range, in index order,
+        skipping objects without a value.
+        """
+        offset = offset or 0
+        for range_min, range_max in cls._exclude_unset_entries(column_name, lex_min, lex_max):
+            if offset:
+                # skip whole ranges without fetching them
+                in_range = await db.zlexcount(cls.get_index_key(column_name), min=range_min, max=range_max)
+                if offset >= in_range:
+                    offset -= in_range
+                    continue
+            async for key in cls._iter_ids_in_lex_range(db, column_name, range_min, range_max, offset, limit):
+                yield key
+                if limit is not None:
+                    limit -= 1
+            if limit == 0:
+                return
+            offset = 0
+
+    @classmethod
+    async def _iter_ids_in_lex_range(cls, db, column_name, lex_min, lex_max, offset=None, limit=None):
+        """Stream the identifiers in a LEX_INDEX range, in index order, a page
+        at a time. Each page resumes right after the last entry seen, so the
+        cost is proportional to the number of matches, not the index size.
+        """
+        include_min = True
+        offset = offset or 0
+        while limit is None or limit > 0:
+            count = FILTER_BATCH_SIZE if limit is None else min(limit, FILTER_BATCH_SIZE)
+            entries = await db.zrangebylex(
+                cls.get_index_key(column_name),
+                min=lex_min,
+                max=lex_max,
+                include_min=include_min,
+                offset=offset,
+                count=count,
+            )
+            for entry in entries:
+                yield entry.partition(VALUE_ID_SEPARATOR)[2]
+            if len(entries) < count:
+                return
+            if limit is not None:
+                limit -= len(entries)
+            lex_min, include_min, offset = entries[-1].encode(), False, 0
+
+    @classmethod
+    async def filter_by(cls, db, offset=None, limit=None, prefetch=None, **kwargs):
         """Query by attributes iteratively. Ordering is not supported
         Example:
             User.get_by(db, age=[32, 54])
             User.get_by(db, age=23, name="guido")
+            User.get_by(db, name__startswith="gui")
+            User.get_by(db, _search="guido van", country_code="NL")  # see Query.search()
 
+        A query made of lookups on a single str column (see LEX_LOOKUPS) is
+        streamed straight out of the index, in column order.
+        With prefetch=N, up to N objects are loaded ahead of the consumer so
+        redis round trips overlap with the work done on each object.
         """
         if limit and type(limit) is not int:
             raise InvalidQuery('If limit is supplied it must be an int')
         if offset and type(offset) is not int:
             raise InvalidQuery('If offset is supplied it must be an int')
+        if prefetch and type(prefetch) is not int:
+            raise InvalidQuery('If prefetch is supplied it must be an int')
+
+        equality_kwargs, lex_ranges = cls._parse_lex_lookups(kwargs)
+        if len(lex_ranges) == 1 and set(equality_kwargs.keys()) <= {'order_by'} and not kwargs.get('order_by'):
+            (column_name, (lex_min, lex_max)), = lex_ranges.items()
+            keys = cls._iter_ids_by_lex_range(db, column_name, lex_min, lex_max, offset, limit or None)
+            loads = cls._load_ahead(db, keys, prefetch)
+            try:
+                async for x in loads:
+                    yield x
+            finally:
+                # cancel the pending loads as soon as the consumer stops, not when loads is collected
+                await loads.aclose()
+            return
 
         ids_to_iterate = await cls._get_ids_filter_by(db, **kwargs)
         if offset:
@@ -358,9 +1019,35 @@ class RedisModel(object, metaclass=ModelMeta):
         elif limit:
             ids_to_iterate = ids_to_iterate[:limit]
 
+        if prefetch:
+            loads = cls._load_ahead(db, _iter_list(ids_to_iterate), prefetch)
+            try:
+                async for x in loads:
+                    yield x
+            finally:
+                await loads.aclose()
+            return
         for key in ids_to_iterate:
             yield await cls.load(db, key)
 
+    @classmethod
+    async def _load_ahead(cls, db, keys, prefetch):
+        """Yield cls.load() of every key of the async iterable `keys`, in
+        order, with at most `prefetch` loads in flight ahead of the consumer.
+        """
+        pending = deque()
+        try:
+            async for key in keys:
+                pending.append(asyncio.ensure_future(cls.load(db, key)))
+                if len(pending) > (prefetch or 0):
+                    yield await pending.popleft()
+            while pending:
+                yield await pending.popleft()
+        finally:
+            # the consumer stopped early, drop the loads nobody will read
+            for future in pending:
+                future.cancel()
+
     @classmethod
     async def get_object_or_none(cls, db, **kwargs):
         """
@@ -372,6 +1059,216 @@ class RedisModel(object, metaclass=ModelMeta):
             return obj
         return None
 
+    @classmethod
+    async def _get_field_values(cls, db, ids, column_names):
+        """Fetch some fields of many objects without loading them: one
+        SORT ... GET over a temporary set of the ids, all in one transaction.
+        Returns one list of raw values (None when unset) per column name.
+        """
+        if not ids:
+            return [[] for _ in column_names]
+        pairs = []
+        for x in ids:
+            pairs.extend([0, x])
+        temp_key = 'aggregate_ids-{}'.format(uuid.uuid1())
+        tr = db.multi_exec()
+        tr.zadd(temp_key, *pairs)
+        values_future = tr.sort(
+            temp_key,
+            *['{}{}*->{}'.format(cls.key_prefix(), MODEL_NAME_ID_SEPARATOR, name) for name in column_names],
+            by='nosort'
+        )
+        tr.delete(temp_key)
+        await tr.execute()
+        values = await values_future
+        return [values[i::len(column_names)] for i in range(len(column_names))]
+
+    @classmethod
+    async def _count(cls, db, **kwargs):
+        """Number of objects matching the filter_by() style kwargs, see
+        Query.count(). No filter or one equality on an index is counted by
+        redis (ZCARD, SCARD or ZLEXCOUNT), anything else needs the ids.
+        """
+        if not kwargs:
+            return await db.zcard(cls.get_index_key(cls._identifier_column_names[0]))
+        source = cls._aggregate_source(kwargs)
+        if source is None:
+            return len(await cls._get_ids_filter_by(db, **kwargs))
+        (index_key, ), args = source
+        if args[0] == 'set':
+            return await db.scard(index_key)
+        # the script's ZRANGEBYLEX bounds, without the '[' zlexcount adds
+        return await db.zlexcount(index_key, min=args[1][1:], max=args[2][1:])
+
+    @classmethod
+    async def _count_by(cls, db, column_name, **kwargs):
+        """Count the objects matching the filter_by() style kwargs per value of
+        `column_name`. Returns a dict of value to count; objects without a
+        value are counted under None.
+        Unfiltered counts on indexed columns are answered from the index alone,
+        with a couple of commands per distinct value.
+        Example:
+            await User.query(db).filter(gender='female').group_by('country_code').count()
+        """
+        column = cls._columns_map.get(column_name)
+        if column is None:
+            err_msg = '{} not in {}'.format(column_name, set(cls._columns_map.keys()))
+            raise InvalidQuery(err_msg)
+
+        def decode(raw_value):
+            if raw_value is None or raw_value == str(column):
+                return None
+            if column.field_type == datetime and '.' not in raw_value:
+                # an index value written with str(), before _index_value() existed
+                raw_value += '.000000'
+            return cls._decode_field(column_name, raw_value)
+
+        counts = Counter()
+        if kwargs or column_name not in cls._queryable_colnames_set or column_name in cls._unique_column_names:
+            ids = await cls._get_ids_filter_by(db, **kwargs)
+            values, = await cls._get_field_values(db, ids, [column_name])
+            counts.update(decode(value) for value in values)
+        elif column_name in cls._set_indexed_column_names:
+            values = await db.smembers(cls.get_set_index_values_key(column_name))
+            pipe = db.pipeline()
+            futures = [pipe.scard(cls.get_set_index_key(column_name, value)) for value in values]
+            await pipe.execute()
+            for value, future in zip(values, futures):
+                count = await future
+                # a value being pruned can still be listed with an empty set
+                if count:
+                    counts[decode(value)] += count
+        else:
+            # Walk the distinct values of the lex index: find the next value, then
+            # count its `value\x00` prefix with ZLEXCOUNT and skip past it
+            index_key = cls.get_index_key(column_name)
+            lex_min, include_min = b'-', True
+            while True:
+                entries = await db.zrangebylex(index_key, min=lex_min, include_min=include_min, offset=0, count=1)
+                if not entries:
+                    break
+                value = entries[0].partition(VALUE_ID_SEPARATOR)[0]
+                prefix = (value + VALUE_ID_SEPARATOR).encode()
+                counts[decode(value)] += await db.zlexcount(index_key, min=prefix, max=prefix + b'\xff')
+                lex_min, include_min = prefix + b'\xff', False
+        return dict(counts)
+
+    @classmethod
+    async def _aggregate(cls, db, aggregations, **kwargs):
+        """Aggregate columns over the objects matching the filter_by() style
+        kwargs without loading them. `aggregations` maps a result name to a
+        (function, column name) pair, function being one of AGGREGATE_FUNCTIONS.
+        sum and avg need int columns. Unset values are ignored.
+        Example:
+            User._aggregate(db, {'oldest': ('max', 'age'), 'mean_age': ('avg', 'age')}, status='active')
+        Unfiltered and single-index queries are reduced by a script inside redis,
+        which only returns the results. Anything else, or a server without
+        scripting, fetches the column values and reduces them here.
+        """
+        for name, (function, column_name) in aggregations.items():
+            column = cls._columns_map.get(column_name)
+            if function not in AGGREGATE_FUNCTIONS:
+                err_msg = 'Aggregate function {} is not one of {}'.format(function, AGGREGATE_FUNCTIONS)
+                raise InvalidQuery(err_msg)
+            if column is None:
+                err_msg = '{} not in {}'.format(column_name, set(cls._columns_map.keys()))
+                raise InvalidQuery(err_msg)
+            if function in ('sum', 'avg') and column.field_type != int:
+                err_msg = 'Aggregate function {} needs an int column, got {}'.format(function, column_name)
+                raise InvalidQuery(err_msg)
+
+        column_names = sorted({column_name for _, column_name in aggregations.values()})
+        stats = await cls._get_column_stats_in_redis(db, column_names, kwargs)
+        if stats is None:
+            ids = await cls._get_ids_filter_by(db, **kwargs)
+            raw_values = await cls._get_field_values(db, ids, column_names)
+            stats = {}
+            for column_name, values in zip(column_names, raw_values):
+                values = [cls._decode_field(column_name, value) for value in values if value is not None]
+                stats[column_name] = (
+                    len(values),
+                    sum(values) if cls._columns_map[column_name].field_type == int else None,
+                    min(values) if values else None,
+                    max(values) if values else None,
+                )
+
+        result = {}
+        for name, (function, column_name) in aggregations.items():
+            count, total, minimum, maximum = stats[column_name]
+            if function == 'count':
+                result[name] = count
+            elif function == 'sum':
+                result[name] = total
+            elif not count:
+                result[name] = None
+            elif function == 'avg':
+                result[name] = total / count
+            else:
+                result[name] = minimum if function == 'min' else maximum
+        return result
+
+    @classmethod
+    def _aggregate_source(cls, kwargs):
+        """The index AGGREGATE_SCRIPT can read the identifiers matching kwargs
+        from, as script keys and arguments, or None if it takes more than one.
+        _count() counts straight from that index too.
+        """
+        if not kwargs:
+            return [cls.get_index_key(cls._identifier_column_names[0])], ['lex', b'-', b'+']
+        if len(kwargs) != 1:
+            return None
+        (column_name, value), = kwargs.items()
+        if column_name not in cls._queryable_colnames_set or column_name in cls._unique_column_names or \
+                isinstance(value, (list, tuple)):
+            return None
+        value, = cls._lookup_values(column_name, value)
+        if column_name in cls._set_indexed_column_names:
+            return [cls.get_set_index_key(column_name, value)], ['set']
+        prefix = (value + VALUE_ID_SEPARATOR).encode()
+        return [cls.get_index_key(column_name)], ['lex', b'[' + prefix, b'[' + prefix + b'\xff']
+
+    @classmethod
+    async def _get_column_stats_in_redis(cls, db, column_names, kwargs):
+        """{column name: (count, sum, min, max)} of the objects matching
+        kwargs, computed by AGGREGATE_SCRIPT. sum is None for non int columns.
+        Returns None when the query or the server can't be handled that way.
+        """
+        source = cls._aggregate_source(kwargs)
+        if source is None:
+            return None
+        keys, args = source
+        args.append('{}{}'.format(cls.key_prefix(), MODEL_NAME_ID_SEPARATOR))
+        for column_name in column_names:
+            args.extend([column_name, int(cls._columns_map[column_name].field_type == int)])
+        try:
+            reply = await db.eval(AGGREGATE_SCRIPT, keys=keys, args=args)
+        except ReplyError as e:
+            if 'unknown command' not in str(e).lower():
+                raise
+            return None
+
+        stats = {}
+        for i, column_name in enumerate(column_names):
+            count, total, minimum, maximum = reply[i * 4:i * 4 + 4]
+            stats[column_name] = (
+                int(count),
+                int(total) if total is not None else None,
+                cls._decode_field(column_name, minimum) if minimum is not None else None,
+                cls._decode_field(column_name, maximum) if maximum is not None else None,
+            )
+        return stats
+
     @classmethod
     def query(cls, db) -> Query:
         return Query(model=cls, db=db)
+
+
+def tokenize(text):
+    """Lowercase words of `text`, as indexed by search columns.
+    """
+    return set(SEARCH_TOKEN_RE.findall(text.lower()))
+
+
+async def _iter_list(items):
+    for x in items:
+        yield x
@@ -5,12 +5,21 @@ class Query(object):
         self._order_by = None
         self._limit = None
         self._offset = None
+        self._group_by = None
+        self._prefetch = None
         self._db = db
 
     def filter(self, **kwargs):
         self._filter.update(kwargs)
         return self
 
+    def search(self, text):
+        """Only objects with every word of `text` in their search columns.
+        Passed on as the _search filter, so a column may be named search.
+        """
+        self._filter['_search'] = text
+        return self
+
     def order_by(self, order_by):
         self._order_by = order_by
         return self
@@ -23,12 +32,23 @@ class Query(object):
         self._offset = offset
         return self
 
+    def prefetch(self, prefetch):
+        """Load up to `prefetch` objects ahead of the iteration.
+        """
+        self._prefetch = prefetch
+        return self
+
+    def group_by(self, column_name):
+        self._group_by = column_name
+        return self
+
     def __aiter__(self):
         self.result_set = self._model.filter_by(
             db=self._db,
             order_by=self._order_by,
             limit=self._limit,
             offset=self._offset,
+            prefetch=self._prefetch,
             **self._filter,)
 
         return self
@@ -40,3 +60,17 @@ class Query(object):
 
     async def first(self):
         return await self._model.get_object_or_none(db=self._db, order_by=self._order_by, **self._filter)
+
+    async def count(self):
+        """Number of matching objects, or a dict of value to count if
+        group_by() was used.
+        """
+        if self._group_by:
+            return await self._model._count_by(self._db, self._group_by, **self._filter)
+        return await self._model._count(db=self._db, **self._filter)
+
+    async def aggregate(self, **aggregations):
+        """Example:
+            await User.query(db).filter(status='active').aggregate(oldest=('max', 'age'))
+        """
+        return await self._model._aggregate(self._db, aggregations, **self._filter)
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+
+import json
+import logging
+
+from .model import MODEL_NAME_ID_SEPARATOR
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 500
+
+
+async def _iter_object_batches(db, model, batch_size):
+    """Yield lists of up to batch_size stored hashes of `model`, read with
+    SCAN and one pipelined HGETALL per batch.
+    """
+    keys = []
+    async for key in db.iscan(match='{}{}*'.format(model.key_prefix(), MODEL_NAME_ID_SEPARATOR), count=batch_size):
+        keys.append(key)
+        if len(keys) == batch_size:
+            yield await _fetch(db, keys)
+            keys = []
+    if keys:
+        yield await _fetch(db, keys)
+
+
+async def _fetch(db, keys):
+    pipe = db.pipeline()
+    futures = [pipe.hgetall(key) for key in keys]
+    await pipe.execute()
+    return [data for data in [await future for future in futures] if data]
+
+
+async def export(db, model, stream, batch_size=DEFAULT_BATCH_SIZE):
+    """Write every object of `model` to the text `stream` as NDJSON, one
+    stored hash per line. Memory use is bounded by batch_size.
+    Expiry times and change stream history are not exported.
+    Returns the number of objects written.
+    Example:
+        with open('users.ndjson', 'w') as f:
+            await export(db, User, f)
+    """
+    count = 0
+    async for batch in _iter_object_batches(db, model, batch_size):
+        for data in batch:
+            stream.write(json.dumps(data, sort_keys=True))
+            stream.write('\n')
+        count += len(batch)
+    logger.debug('Exported {} {} objects'.format(count, model.__name__))
+    return count
+
+
+async def import_(db, model, stream, batch_size=DEFAULT_BATCH_SIZE, build_index=True):
+    """Load objects of `model` from an NDJSON text `stream` written by
+    export(), with one pipeline per batch_size objects.
+    Indexes are built in a second pass at the end, or left to a later
+    rebuild_index() call with build_index=False. The snapshot is trusted:
+    unique values are not checked and no change records are written.
+    auto_increment counters are moved past the imported values.
+    Returns the number of objects read.
+    """
+    count = 0
+    auto_values = {column.name: 0 for column in model._auto_columns}
+    batch = []
+    for line in stream:
+        if not line.strip():
+            continue
+        batch.append(json.loads(line))
+        if len(batch) == batch_size:
+            count += await _write_batch(db, model, batch, auto_values)
+            batch = []
+    if batch:
+        count += await _write_batch(db, model, batch, auto_values)
+
+    for column in model._auto_columns:
+        auto_key = column.get_auto_key(model)
+        if auto_values[column.name] > int(await db.get(auto_key) or 0):
+            await db.set(auto_key, auto_values[column.name])
+    logger.debug('Imported {} {} objects'.format(count, model.__name__))
+
+    if build_index:
+        await rebuild_index(db, model, batch_size=batch_size)
+    return count
+
+
+async def _write_batch(db, model, batch, auto_values):
+    pipe = db.pipeline()
+    for data in batch:
+        obj = model._from_redis_data(data)
+        for name in auto_values:
+            if obj.has_real_data(name):
+                auto_values[name] = max(auto_values[name], getattr(obj, name))
+        pipe.hmset_dict(obj.redis_key(), data)
+    await pipe.execute()
+    return len(batch)
+
+
+async def rebuild_index(db, model, batch_size=DEFAULT_BATCH_SIZE):
+    """Write the index entries of every stored object of `model`, with one
+    pipeline per batch. Existing entries are kept, so run it on a fresh
+    import rather than to clean up stale ones.
+    """
+    count = 0
+    async for batch in _iter_object_batches(db, model, batch_size):
+        pipe = db.pipeline()
+        for data in batch:
+            model._from_redis_data(data)._queue_index(pipe)
+        await pipe.execute()
+        count += len(batch)
+    logger.debug('Indexed {} {} objects'.format(count, model.__name__))
+    return count
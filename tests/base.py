@@ -1,19 +1,53 @@
 import aioredis
 import asyncio
+import os
 from unittest import TestCase
 
+from subconscious.memory import MemoryRedis
+
 
 class BaseTestCase(TestCase):
     def setUp(self):
         self.loop = asyncio.new_event_loop()
         asyncio.set_event_loop(None)
+        self.db = self._connect()
+
+    def _connect(self):
+        """A new connection to the test db. With SUBCONSCIOUS_TEST_DB=memory
+        the suite runs without a redis server and every connection shares
+        the same MemoryRedis.
+        """
+        if os.environ.get('SUBCONSCIOUS_TEST_DB') == 'memory':
+            return self.db if hasattr(self, 'db') else MemoryRedis()
         db_co = aioredis.create_redis(
             address=('localhost', 6379),
             db=13,
             loop=self.loop,
             encoding='utf-8',
         )
-        self.db = self.loop.run_until_complete(db_co)
+        db = self.loop.run_until_complete(db_co)
+        if hasattr(self, 'db'):
+            self.addCleanup(db.close)
+        return db
+
+    def _run(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    def _ids(self, results):
+        """Identifiers of the objects of an async iterable, such as
+        filter_by() or a Query.
+        """
+        async def _collect():
+            return [x.identifier() async for x in results]
+        return self._run(_collect())
+
+    def _command(self, name, *args, **kwargs):
+        """Run one db command, e.g. self._command('zcard', key). aioredis
+        commands need the loop running when they are called.
+        """
+        async def _execute():
+            return await getattr(self.db, name)(*args, **kwargs)
+        return self._run(_execute())
 
     def tearDown(self):
         async def delete_all():
@@ -0,0 +1,165 @@
+from subconscious.column import Column, SET_INDEX
+from subconscious.model import RedisModel, InvalidQuery
+from datetime import datetime
+from unittest import mock
+from .base import BaseTestCase
+
+
+class TestUser(RedisModel):
+    id = Column(primary_key=True)
+    name = Column(index=True)
+    age = Column(index=True, type=int)
+    score = Column(type=int, required=False)
+    country_code = Column(index=True, index_type=SET_INDEX)
+    status = Column(index=True, required=False)
+    joined = Column(type=datetime, required=False)
+
+
+class TestStock(RedisModel):
+    id = Column(primary_key=True)
+    count = Column(type=int, index=True)
+    aggregate = Column(required=False)
+
+
+class TestShift(RedisModel):
+    id = Column(primary_key=True)
+    start = Column(type=datetime, index=True)
+    day = Column(type=datetime, index=True, index_type=SET_INDEX)
+
+
+USERS = [
+    dict(name='a', age=20, score=5, country_code='USA', status='active', joined=datetime(2018, 1, 1)),
+    dict(name='b', age=30, score=7, country_code='USA', status='active', joined=datetime(2018, 6, 1)),
+    dict(name='c', age=40, country_code='USA', status='inactive'),
+    dict(name='d', age=30, score=1, country_code='CAN'),
+]
+
+
+class TestAggregate(BaseTestCase):
+    def setUp(self):
+        super(TestAggregate, self).setUp()
+        for i, kwargs in enumerate(USERS):
+            user = TestUser(id=str(i), **kwargs)
+            self._run(user.save(self.db))
+
+    def test_aggregate(self):
+        result = self._run(TestUser.query(self.db).aggregate(
+            youngest=('min', 'age'),
+            oldest=('max', 'age'),
+            total=('sum', 'score'),
+            mean=('avg', 'score'),
+            scored=('count', 'score'),
+            last_joined=('max', 'joined'),
+        ))
+        self.assertEqual({
+            'youngest': 20,
+            'oldest': 40,
+            'total': 13,
+            'mean': 13 / 3,
+            'scored': 3,
+            'last_joined': datetime(2018, 6, 1),
+        }, result)
+
+    def test_aggregate_with_filter(self):
+        result = self._run(TestUser.query(self.db).filter(country_code='USA', status='active').aggregate(
+            oldest=('max', 'age'),
+            mean=('avg', 'age'),
+        ))
+        self.assertEqual({'oldest': 30, 'mean': 25}, result)
+
+    def test_aggregate_over_one_index(self):
+        result = self._run(TestUser.query(self.db).filter(country_code='USA').aggregate(
+            oldest=('max', 'age'),
+            total=('sum', 'score'),
+            first_name=('min', 'name'),
+            last_joined=('max', 'joined'),
+            joined=('count', 'joined'),
+        ))
+        self.assertEqual(
+            {'oldest': 40, 'total': 12, 'first_name': 'a', 'last_joined': datetime(2018, 6, 1), 'joined': 2},
+            result,
+        )
+        result = self._run(TestUser.query(self.db).filter(age=30).aggregate(mean=('avg', 'score'), n=('count', 'id')))
+        self.assertEqual({'mean': 4, 'n': 2}, result)
+        result = self._run(TestUser.query(self.db).filter(status=None).aggregate(oldest=('max', 'age')))
+        self.assertEqual({'oldest': 30}, result)
+
+    def test_aggregate_no_match(self):
+        result = self._run(TestUser.query(self.db).filter(country_code='MEX').aggregate(
+            oldest=('max', 'age'),
+            total=('sum', 'age'),
+            n=('count', 'age'),
+        ))
+        self.assertEqual({'oldest': None, 'total': 0, 'n': 0}, result)
+
+    def test_bad_aggregate_should_fail(self):
+        with self.assertRaises(InvalidQuery):
+            self._run(TestUser.query(self.db).aggregate(x=('median', 'age')))
+        with self.assertRaises(InvalidQuery):
+            self._run(TestUser.query(self.db).aggregate(x=('sum', 'name')))
+        with self.assertRaises(InvalidQuery):
+            self._run(TestUser.query(self.db).aggregate(x=('max', 'nope')))
+
+    def test_count(self):
+        # no filter or one index lookup is counted in redis, without fetching ids
+        with mock.patch.object(TestUser, '_get_ids_filter_by', side_effect=AssertionError):
+            self.assertEqual(4, self._run(TestUser.query(self.db).count()))
+            self.assertEqual(3, self._run(TestUser.query(self.db).filter(country_code='USA').count()))
+            self.assertEqual(2, self._run(TestUser.query(self.db).filter(age=30).count()))
+            self.assertEqual(1, self._run(TestUser.query(self.db).filter(status=None).count()))
+            self.assertEqual(0, self._run(TestUser.query(self.db).filter(name='z').count()))
+        self.assertEqual(2, self._run(TestUser.query(self.db).filter(country_code='USA', status='active').count()))
+        self.assertEqual(2, self._run(TestUser.query(self.db).filter(age=[20, 40]).count()))
+
+    def test_group_by_count_lex_index(self):
+        self.assertEqual({20: 1, 30: 2, 40: 1}, self._run(TestUser.query(self.db).group_by('age').count()))
+        self.assertEqual(
+            {'active': 2, 'inactive': 1, None: 1},
+            self._run(TestUser.query(self.db).group_by('status').count()),
+        )
+
+    def test_group_by_count_set_index(self):
+        self.assertEqual({'USA': 3, 'CAN': 1}, self._run(TestUser.query(self.db).group_by('country_code').count()))
+
+    def test_group_by_count_datetime(self):
+        whole, fraction = datetime(2020, 1, 1), datetime(2020, 1, 1, 0, 0, 0, 500)
+        for i, start in enumerate([whole, whole, fraction]):
+            self._run(TestShift(id=str(i), start=start, day=whole).save(self.db))
+        self.assertEqual({whole: 2, fraction: 1}, self._run(TestShift.query(self.db).group_by('start').count()))
+        self.assertEqual({whole: 3}, self._run(TestShift.query(self.db).group_by('day').count()))
+        self.assertEqual(2, self._run(TestShift.query(self.db).filter(start=whole).count()))
+        # entries indexed with str() before values were encoded like lookups
+        self._command('zadd', TestShift.get_index_key('start'), 0, '2019-01-01 00:00:00\x009')
+        self.assertEqual(1, self._run(TestShift.query(self.db).group_by('start').count())[datetime(2019, 1, 1)])
+
+    def test_group_by_count_with_filter(self):
+        self.assertEqual(
+            {'active': 2, 'inactive': 1},
+            self._run(TestUser.query(self.db).filter(country_code='USA').group_by('status').count()),
+        )
+        self.assertEqual(
+            {5: 1, 7: 1, None: 1},
+            self._run(TestUser.query(self.db).filter(country_code='USA').group_by('score').count()),
+        )
+
+    def test_group_by_count_after_update(self):
+        user = self._run(TestUser.load(self.db, identifier='3'))
+        user.country_code = 'USA'
+        self._run(user.save(self.db))
+        self.assertEqual({'USA': 4}, self._run(TestUser.query(self.db).group_by('country_code').count()))
+        self.assertEqual({'USA': 4}, self._run(
+            TestUser.query(self.db).filter(age=[20, 30, 40]).group_by('country_code').count()))
+        self.assertEqual(['USA'], self._command('smembers', TestUser.get_set_index_values_key('country_code')))
+
+    def test_group_by_count_after_delete(self):
+        self._run(self._run(TestUser.load(self.db, identifier='3')).delete(self.db))
+        self.assertEqual({'USA': 3}, self._run(TestUser.query(self.db).group_by('country_code').count()))
+        self.assertEqual(['USA'], self._command('smembers', TestUser.get_set_index_values_key('country_code')))
+
+    def test_columns_named_like_query_methods(self):
+        for i in range(3):
+            self._run(TestStock(id=str(i), count=i * 10, aggregate='x').save(self.db))
+        self.assertEqual(3, self._run(TestStock.query(self.db).count()))
+        self.assertEqual(1, self._run(TestStock.query(self.db).filter(count=10).count()))
+        self.assertEqual({'total': 30}, self._run(TestStock.query(self.db).aggregate(total=('sum', 'count'))))
+        self.assertEqual({0: 1, 10: 1, 20: 1}, self._run(TestStock.query(self.db).group_by('count').count()))
@@ -0,0 +1,97 @@
+from subconscious.changes import consume_changes
+from subconscious.column import Column, SET_INDEX
+from subconscious.model import RedisModel
+from .base import BaseTestCase
+
+
+class TestUser(RedisModel):
+    __change_stream__ = True
+
+    id = Column(primary_key=True)
+    name = Column(index=True)
+    email = Column(unique=True)
+    country_code = Column(index=True, index_type=SET_INDEX)
+
+
+class TestUserNoStream(RedisModel):
+    id = Column(primary_key=True)
+    name = Column(index=True)
+
+
+class TestChanges(BaseTestCase):
+
+    def _consume(self, count, group_name='mirror', consumer_name='worker-1', latest_id='0'):
+        async def _test():
+            changes = []
+            async for change in consume_changes(
+                    self.db, TestUser, group_name, consumer_name, block_ms=10, latest_id=latest_id):
+                changes.append(change)
+                if len(changes) == count:
+                    break
+            return changes
+        return self._run(_test())
+
+    def test_save_and_delete_emit_changes(self):
+        user = TestUser(id='1', name='john', email='john@example.com', country_code='USA')
+        self._run(user.save(self.db))
+        user.name = 'johnny'
+        self._run(user.save(self.db))
+        self.assertTrue(self._run(user.delete(self.db)))
+
+        changes = self._consume(3)
+        self.assertEqual(['save', 'save', 'delete'], [x.op for x in changes])
+        self.assertEqual([1, 2, 3], [x.version for x in changes])
+        self.assertEqual({'TestUser'}, {x.model for x in changes})
+        self.assertEqual({'1'}, {x.identifier for x in changes})
+        self.assertEqual(
+            {'id': '1', 'name': 'john', 'email': 'john@example.com', 'country_code': 'USA'},
+            changes[0].fields,
+        )
+        # only what changed
+        self.assertEqual({'name': 'johnny'}, changes[1].fields)
+        self.assertEqual({}, changes[2].fields)
+
+    def test_group_resumes_after_acknowledged_changes(self):
+        for i in range(3):
+            self._run(TestUser(id=str(i), name='n', email='{}@example.com'.format(i), country_code='USA').save(self.db))
+        self.assertEqual(['0', '1'], [x.identifier for x in self._consume(2)])
+        # the consumer stopped before asking for what follows '1', so '1' was never acknowledged
+        self.assertEqual(['1', '2'], [x.identifier for x in self._consume(2)])
+        self._run(TestUser(id='3', name='n', email='3@example.com', country_code='USA').save(self.db))
+        self.assertEqual(['2', '3'], [x.identifier for x in self._consume(2)])
+        # another group sees everything
+        self.assertEqual(['0', '1', '2', '3'], [x.identifier for x in self._consume(4, group_name='audit')])
+
+    def test_stream_is_capped(self):
+        TestUser.__change_stream_maxlen__ = 10
+        try:
+            for i in range(300):
+                self._run(TestUser(id='1', name='n{}'.format(i), email='a', country_code='USA').save(self.db))
+        finally:
+            TestUser.__change_stream_maxlen__ = 10000
+        # MAXLEN ~ only trims whole stream nodes (100 entries by default), so some more than 10 may be kept
+        length = self._command('xlen', TestUser.get_stream_key())
+        self.assertGreaterEqual(length, 10)
+        self.assertLess(length, 150)
+
+    def test_no_stream_by_default(self):
+        self._run(TestUserNoStream(id='1', name='john').save(self.db))
+        self.assertFalse(self._command('exists', TestUserNoStream.get_stream_key()))
+
+
+class TestDelete(BaseTestCase):
+    def test_delete_removes_index_entries(self):
+        user = TestUser(id='1', name='john', email='john@example.com', country_code='USA')
+        self._run(user.save(self.db))
+        # deleting uses the stored values, not local modifications
+        user.name = 'not saved'
+        self.assertTrue(self._run(user.delete(self.db)))
+        self.assertFalse(self._run(user.delete(self.db)))
+
+        self.assertEqual([], self._ids(TestUser.filter_by(self.db, name='john')))
+        self.assertEqual([], self._ids(TestUser.filter_by(self.db, country_code='USA')))
+        self.assertEqual([], self._ids(TestUser.all(self.db)))
+        self.assertIsNone(self._run(TestUser.load(self.db, identifier='1')))
+        self.assertIsNone(self._run(TestUser.get_by_unique(self.db, email='john@example.com')))
+        # the unique value is free again
+        self._run(TestUser(id='2', name='jim', email='john@example.com', country_code='USA').save(self.db))
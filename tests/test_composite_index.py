@@ -0,0 +1,95 @@
+from datetime import datetime
+from subconscious.column import Column
+from subconscious.model import RedisModel, InvalidModelDefinition, InvalidQuery
+from subconscious.snapshot import rebuild_index
+from .base import BaseTestCase
+
+
+class TestPerson(RedisModel):
+    __indexes__ = [('country_code', 'gender', 'status')]
+
+    id = Column(primary_key=True)
+    country_code = Column()
+    gender = Column(index=True)
+    status = Column(required=False)
+    age = Column(type=int, index=True)
+
+
+class TestShift(RedisModel):
+    __indexes__ = [('team', 'start')]
+
+    id = Column(primary_key=True)
+    team = Column()
+    start = Column(type=datetime)
+
+
+PEOPLE = [
+    dict(id='1', country_code='USA', gender='f', status='active', age=20),
+    dict(id='2', country_code='USA', gender='f', status='inactive', age=30),
+    dict(id='3', country_code='USA', gender='m', status='active', age=30),
+    dict(id='4', country_code='CAN', gender='f', status='active', age=40),
+    dict(id='5', country_code='US', gender='f', age=50),
+]
+
+
+class TestCompositeIndex(BaseTestCase):
+
+    def setUp(self):
+        super(TestCompositeIndex, self).setUp()
+        for kwargs in PEOPLE:
+            self._run(TestPerson(**kwargs).save(self.db))
+
+    def _ids(self, model=TestPerson, **kwargs):
+        return super(TestCompositeIndex, self)._ids(model.filter_by(self.db, **kwargs))
+
+    def test_full_and_prefix_matches(self):
+        self.assertEqual(['1'], self._ids(country_code='USA', gender='f', status='active'))
+        self.assertEqual(['1', '2'], self._ids(country_code='USA', gender='f'))
+        self.assertEqual(['1', '2', '3'], self._ids(country_code='USA'))
+        self.assertEqual(['5'], self._ids(country_code='US', gender='f', status=None))
+
+    def test_lists_and_other_filters(self):
+        self.assertEqual(['1', '3', '4'], self._ids(country_code=['USA', 'CAN'], gender=['f', 'm'], status='active'))
+        self.assertEqual(['2', '3'], self._ids(country_code='USA', age=30))
+        self.assertEqual(['3', '2'], self._ids(country_code='USA', age=30, order_by='-gender'))
+        self.assertEqual(2, self._run(TestPerson.query(self.db).filter(country_code='USA', gender='f').count()))
+
+    def test_query_without_prefix_should_fail(self):
+        with self.assertRaises(InvalidQuery):
+            self._ids(status='active')
+
+    def test_index_follows_updates_and_deletes(self):
+        person = self._run(TestPerson.load(self.db, identifier='1'))
+        person.status = 'inactive'
+        self._run(person.save(self.db))
+        self.assertEqual(['3'], self._ids(country_code='USA', status='active', gender=['f', 'm']))
+        self.assertEqual(['1', '2'], self._ids(country_code='USA', gender='f', status='inactive'))
+
+        self._run(person.delete(self.db))
+        self.assertEqual(['2'], self._ids(country_code='USA', gender='f', status='inactive'))
+        key = TestPerson.get_composite_index_key(('country_code', 'gender', 'status'))
+        self.assertEqual(4, self._command('zcard', key))
+
+    def test_rebuild_index(self):
+        key = TestPerson.get_composite_index_key(('country_code', 'gender', 'status'))
+        self._command('delete', key)
+        self._run(rebuild_index(self.db, TestPerson))
+        self.assertEqual(['1', '2'], self._ids(country_code='USA', gender='f'))
+
+    def test_datetime_values(self):
+        for i, start in enumerate([datetime(2018, 1, 1, 9), datetime(2018, 1, 1, 9, 0, 0, 500), datetime(2018, 1, 2)]):
+            self._run(TestShift(id=str(i), team='a', start=start).save(self.db))
+        self.assertEqual(['0'], self._ids(TestShift, team='a', start=datetime(2018, 1, 1, 9)))
+        self.assertEqual(['1'], self._ids(TestShift, team='a', start=datetime(2018, 1, 1, 9, 0, 0, 500)))
+        starts = [datetime(2018, 1, 1, 9), datetime(2018, 1, 2)]
+        self.assertEqual(['0', '2'], self._ids(TestShift, team='a', start=starts))
+
+    def test_bad_definitions_should_fail(self):
+        with self.assertRaises(InvalidModelDefinition):
+            class TestBadIndex(RedisModel):
+                __indexes__ = [('id', 'nope')]
+                id = Column(primary_key=True)
+        with self.assertRaises(InvalidModelDefinition):
+            class TestShortIndex(RedisModel):
+                __indexes__ = [('id', )]
+                id = Column(primary_key=True)
@@ -0,0 +1,145 @@
+from subconscious.changes import consume_changes
+from subconscious.column import Column, SET_INDEX
+from subconscious.expiry import reap_expired, run_reaper
+from subconscious.model import RedisModel
+from .base import BaseTestCase
+from unittest import mock
+import asyncio
+import time
+
+
+class TestSession(RedisModel):
+    __ttl__ = 60
+    __change_stream__ = True
+
+    id = Column(primary_key=True)
+    user = Column(index=True)
+    token = Column(unique=True)
+    kind = Column(index=True, index_type=SET_INDEX)
+
+
+class TestQuote(RedisModel):
+    id = Column(primary_key=True)
+    pair = Column(index=True)
+
+
+class TestExpiry(BaseTestCase):
+
+    def _save_sessions(self, count, ttl=None):
+        for i in range(count):
+            session = TestSession(id=str(i), user='u{}'.format(i % 2), token='t{}'.format(i), kind='web')
+            self._run(session.save(self.db, ttl=ttl))
+
+    def test_reap_removes_objects_and_index_entries(self):
+        self._save_sessions(3)
+        later = time.time() + 61
+        self.assertEqual(0, self._run(reap_expired(self.db, TestSession)))
+        self.assertEqual(3, self._run(reap_expired(self.db, TestSession, now=later)))
+
+        self.assertEqual([], self._ids(TestSession.all(self.db)))
+        self.assertEqual([], self._ids(TestSession.filter_by(self.db, user='u0')))
+        self.assertEqual([], self._ids(TestSession.filter_by(self.db, kind='web')))
+        self.assertIsNone(self._run(TestSession.get_by_unique(self.db, token='t0')))
+        self.assertEqual(0, self._command('zcard', TestSession.get_expiry_key()))
+        self.assertEqual(0, self._command('exists', TestSession.get_index_key('user')))
+
+    def test_reap_in_batches(self):
+        self._save_sessions(5)
+        later = time.time() + 61
+        self.assertEqual(2, self._run(reap_expired(self.db, TestSession, batch_size=2, now=later)))
+        self.assertEqual(3, len(self._ids(TestSession.all(self.db))))
+        self.assertEqual(3, self._run(reap_expired(self.db, TestSession, batch_size=10, now=later)))
+        self.assertEqual([], self._ids(TestSession.all(self.db)))
+
+    def test_per_save_ttl(self):
+        self._save_sessions(2, ttl=10)
+        session = self._run(TestSession.load(self.db, identifier='0'))
+        # ttl=0 keeps it forever
+        self._run(session.save(self.db, ttl=0))
+        self.assertEqual(1, self._run(reap_expired(self.db, TestSession, now=time.time() + 11)))
+        self.assertEqual(['0'], self._ids(TestSession.all(self.db)))
+
+    def test_saving_again_extends_ttl(self):
+        self._save_sessions(1, ttl=10)
+        session = self._run(TestSession.load(self.db, identifier='0'))
+        self._run(session.save(self.db, ttl=100))
+        self.assertEqual(0, self._run(reap_expired(self.db, TestSession, now=time.time() + 11)))
+        self.assertEqual(['0'], self._ids(TestSession.all(self.db)))
+
+    def test_saving_again_while_reaped_keeps_object(self):
+        self._save_sessions(1)
+        session = self._run(TestSession.load(self.db, identifier='0'))
+        reaper_db = self._connect()
+        incrby = type(reaper_db).incrby
+        saved = []
+
+        async def _save_then_incrby(db, *args, **kwargs):
+            # the reaper has read the batch and is about to delete it
+            if not saved:
+                saved.append(session)
+                session.user = 'u9'
+                await session.save(self.db, ttl=100)
+            return await incrby(db, *args, **kwargs)
+        with mock.patch.object(type(reaper_db), 'incrby', _save_then_incrby):
+            self.assertEqual(0, self._run(reap_expired(reaper_db, TestSession, now=time.time() + 61)))
+
+        self.assertEqual([session], saved)
+        self.assertEqual('u9', self._run(TestSession.load(self.db, identifier='0')).user)
+        self.assertEqual(['0'], self._ids(TestSession.filter_by(self.db, user='u9')))
+        self.assertEqual(['0'], self._ids(TestSession.filter_by(self.db, kind='web')))
+        self.assertIsNotNone(self._run(TestSession.get_by_unique(self.db, token='t0')))
+        self.assertEqual(1, self._command('zcard', TestSession.get_expiry_key()))
+
+    def test_no_expiry_bookkeeping_without_ttl(self):
+        quote = TestQuote(id='1', pair='BTCUSD')
+        with mock.patch.object(type(self.db), 'multi_exec') as multi_exec:
+            self._run(quote.save(self.db))
+        multi_exec.assert_not_called()
+        self.assertFalse(self._command('exists', TestQuote.get_expiry_key()))
+        # an explicit ttl is still honoured, and ttl=0 clears it
+        self._run(quote.save(self.db, ttl=10))
+        self._run(quote.save(self.db))
+        self.assertEqual(1, self._run(reap_expired(self.db, TestQuote, now=time.time() + 11)))
+        self._run(quote.save(self.db, ttl=10))
+        self._run(quote.save(self.db, ttl=0))
+        self.assertEqual(0, self._run(reap_expired(self.db, TestQuote, now=time.time() + 11)))
+        self.assertEqual(['1'], self._ids(TestQuote.all(self.db)))
+
+    def test_delete_removes_expiry(self):
+        self._save_sessions(1)
+        session = self._run(TestSession.load(self.db, identifier='0'))
+        self._run(session.delete(self.db))
+        self.assertEqual(0, self._command('zcard', TestSession.get_expiry_key()))
+
+    def test_reaping_is_recorded_in_change_stream(self):
+        self._save_sessions(2)
+        self._run(reap_expired(self.db, TestSession, now=time.time() + 61))
+
+        async def _test():
+            changes = []
+            async for change in consume_changes(self.db, TestSession, 'g', 'c', block_ms=10, latest_id='0'):
+                changes.append(change)
+                if len(changes) == 4:
+                    return changes
+        changes = self._run(_test())
+        self.assertEqual(['save', 'save', 'expire', 'expire'], [x.op for x in changes])
+        self.assertEqual([1, 2, 3, 4], [x.version for x in changes])
+
+    def test_no_ttl_by_default(self):
+        self._run(TestQuote(id='1', pair='BTCUSD').save(self.db))
+        self.assertEqual(0, self._run(reap_expired(self.db, TestQuote, now=time.time() + 10 ** 9)))
+        self.assertIsNotNone(self._run(TestQuote.load(self.db, identifier='1')))
+
+    def test_run_reaper(self):
+        self._save_sessions(3, ttl=0.01)
+
+        async def _test():
+            reaper = asyncio.ensure_future(run_reaper(self.db, [TestSession, TestQuote], interval=0.01, batch_size=2))
+            await asyncio.sleep(0.1)
+            reaper.cancel()
+            try:
+                await reaper
+            except asyncio.CancelledError:
+                pass
+        self._run(_test())
+        self.assertEqual([], self._ids(TestSession.all(self.db)))
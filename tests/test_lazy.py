@@ -0,0 +1,82 @@
+from datetime import datetime
+from subconscious.column import Column
+from subconscious.model import RedisModel, BadDataError, UnexpectedColumnError
+from .base import BaseTestCase
+import enum
+
+
+class Status(enum.Enum):
+    active = 'active'
+    inactive = 'inactive'
+
+
+class TestEvent(RedisModel):
+    id = Column(primary_key=True)
+    name = Column(index=True)
+    count = Column(type=int, required=True)
+    created = Column(type=datetime)
+    status = Column(enum=Status)
+
+
+class TestLazyEvent(TestEvent):
+    __lazy__ = True
+
+
+class TestLazy(BaseTestCase):
+
+    def setUp(self):
+        super(TestLazy, self).setUp()
+        self.created = datetime(2020, 1, 2, 3, 4, 5, 6)
+        self._run(TestEvent(id='1', name='a', count=3, created=self.created, status='active').save(self.db))
+
+    def test_fields_decode_on_access(self):
+        event = self._run(TestEvent.load(self.db, identifier='1', lazy=True))
+        self.assertNotIn('created', event.__dict__)
+        self.assertEqual(3, event.count)
+        self.assertIn('count', event.__dict__)
+        self.assertNotIn('created', event.__dict__)
+        self.assertEqual(self.created, event.created)
+        self.assertEqual('<TestEvent:1>', repr(event))
+
+    def test_same_values_as_eager_load(self):
+        eager = self._run(TestEvent.load(self.db, identifier='1'))
+        lazy = self._run(TestEvent.load(self.db, identifier='1', lazy=True))
+        self.assertEqual(eager.as_dict(), lazy.as_dict())
+        self.assertNotIn('_raw', lazy.__dict__)
+
+    def test_save_lazy_object(self):
+        event = self._run(TestEvent.load(self.db, identifier='1', lazy=True))
+        event.name = 'b'
+        self._run(event.save(self.db))
+        event = self._run(TestEvent.load(self.db, identifier='1'))
+        self.assertEqual(('b', 3, self.created), (event.name, event.count, event.created))
+        self.assertEqual(['1'], self._ids(TestEvent.filter_by(self.db, name='b')))
+
+    def test_unset_fields_are_columns(self):
+        self._run(TestEvent(id='2', name='c', count=1).save(self.db))
+        event = self._run(TestEvent.load(self.db, identifier='2', lazy=True))
+        self.assertFalse(event.has_real_data('created'))
+        self.assertIsInstance(event.created, Column)
+
+    def test_model_default(self):
+        self._command('hmset_dict', TestLazyEvent.make_key('1'), {'id': '1', 'name': 'a', 'count': '3'})
+        event = self._run(TestLazyEvent.load(self.db, identifier='1'))
+        self.assertIn('_raw', event.__dict__)
+        self.assertEqual(3, event.count)
+
+    def test_bad_data_fails_on_access(self):
+        self._command('hset', TestEvent.make_key('1'), 'status', 'deleted')
+        event = self._run(TestEvent.load(self.db, identifier='1', lazy=True))
+        self.assertEqual('a', event.name)
+        with self.assertRaises(BadDataError):
+            event.status
+        with self.assertRaises(BadDataError):
+            self._run(TestEvent.load(self.db, identifier='1'))
+
+    def test_missing_and_unknown_columns_fail_on_load(self):
+        self._command('hset', TestEvent.make_key('1'), 'nope', 'x')
+        with self.assertRaises(UnexpectedColumnError):
+            self._run(TestEvent.load(self.db, identifier='1', lazy=True))
+        self._command('hmset_dict', TestEvent.make_key('3'), {'id': '3'})
+        with self.assertRaises(BadDataError):
+            self._run(TestEvent.load(self.db, identifier='3', lazy=True))
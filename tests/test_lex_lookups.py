@@ -0,0 +1,91 @@
+from subconscious.column import Column, SET_INDEX
+from subconscious.model import RedisModel, InvalidQuery
+from .base import BaseTestCase
+import subconscious.model
+
+
+class TestUser(RedisModel):
+    id = Column(primary_key=True)
+    name = Column(index=True)
+    age = Column(index=True, type=int)
+    country_code = Column(index=True, index_type=SET_INDEX)
+
+
+class TestPet(RedisModel):
+    id = Column(primary_key=True)
+    name = Column(index=True, required=False)
+
+
+NAMES = ['Jo', 'Joan', 'John', 'Johnny', 'Josh', 'Julia', 'Kim']
+
+
+class TestLexLookups(BaseTestCase):
+    def setUp(self):
+        super(TestLexLookups, self).setUp()
+        for i, name in enumerate(NAMES):
+            user = TestUser(id=str(i), name=name, age=i, country_code='USA' if i % 2 else 'CAN')
+            self.loop.run_until_complete(user.save(self.db))
+
+    def _names(self, **kwargs):
+        async def _test():
+            return [x.name async for x in TestUser.filter_by(self.db, **kwargs)]
+        return self.loop.run_until_complete(_test())
+
+    def test_startswith(self):
+        self.assertEqual(['Jo', 'Joan', 'John', 'Johnny', 'Josh'], self._names(name__startswith='Jo'))
+        self.assertEqual(['John', 'Johnny'], self._names(name__startswith='John'))
+        self.assertEqual([], self._names(name__startswith='X'))
+
+    def test_ranges(self):
+        self.assertEqual(['Johnny', 'Josh', 'Julia', 'Kim'], self._names(name__gt='John'))
+        self.assertEqual(['John', 'Johnny', 'Josh', 'Julia', 'Kim'], self._names(name__gte='John'))
+        self.assertEqual(['Jo', 'Joan'], self._names(name__lt='John'))
+        self.assertEqual(['Jo', 'Joan', 'John'], self._names(name__lte='John'))
+        self.assertEqual(['Joan', 'John', 'Johnny'], self._names(name__gt='Jo', name__lt='Josh'))
+
+    def test_limit_and_offset(self):
+        self.assertEqual(['Jo', 'Joan'], self._names(name__startswith='Jo', limit=2))
+        self.assertEqual(['John', 'Johnny'], self._names(name__startswith='Jo', limit=2, offset=2))
+        self.assertEqual(['Josh'], self._names(name__startswith='Jo', offset=4))
+
+    def test_streams_in_pages(self):
+        batch_size = subconscious.model.FILTER_BATCH_SIZE
+        subconscious.model.FILTER_BATCH_SIZE = 2
+        try:
+            self.assertEqual(['Jo', 'Joan', 'John', 'Johnny', 'Josh'], self._names(name__startswith='Jo'))
+            self.assertEqual(['Joan', 'John', 'Johnny'], self._names(name__startswith='Jo', limit=3, offset=1))
+        finally:
+            subconscious.model.FILTER_BATCH_SIZE = batch_size
+
+    def test_combined_with_equality(self):
+        self.assertEqual(['Joan', 'Johnny'], sorted(self._names(name__startswith='Jo', country_code='USA')))
+        self.assertEqual(['Joan'], self._names(name__startswith='Jo', age=1))
+
+    def test_combined_with_order_by(self):
+        self.assertEqual(['Josh', 'Johnny', 'John', 'Joan', 'Jo'], self._names(name__startswith='Jo', order_by='-name'))
+
+    def test_lookup_on_bad_column_should_fail(self):
+        with self.assertRaises(InvalidQuery):
+            self._names(age__gt='1')
+        with self.assertRaises(InvalidQuery):
+            self._names(country_code__startswith='U')
+        with self.assertRaises(InvalidQuery):
+            self._names(name__gt=1)
+
+    def test_unset_values_do_not_match(self):
+        for i, name in enumerate(['Ace', None, 'Zed', None, 'Max']):
+            pet = TestPet(id=str(i)) if name is None else TestPet(id=str(i), name=name)
+            self.loop.run_until_complete(pet.save(self.db))
+
+        def _ids(**kwargs):
+            async def _test():
+                return [x.id async for x in TestPet.filter_by(self.db, **kwargs)]
+            return self.loop.run_until_complete(_test())
+        self.assertEqual(['0', '4'], _ids(name__lt='Z'))
+        self.assertEqual(['0', '4', '2'], _ids(name__gte=''))
+        self.assertEqual(['4', '2'], _ids(name__gte='', offset=1))
+        self.assertEqual(['2'], _ids(name__gte='', offset=2, limit=5))
+        self.assertEqual(['0'], _ids(name__lt='Z', limit=1))
+        self.assertEqual([], _ids(name__startswith='<Col'))
+        self.assertEqual(['0', '4'], sorted(_ids(name__lt='Z', id=['0', '1', '4'])))
+        self.assertEqual(['1', '3'], _ids(name=None))
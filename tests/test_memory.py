@@ -0,0 +1,147 @@
+from aioredis import MultiExecError, ReplyError, WatchVariableError
+from subconscious.column import Column
+from subconscious.memory import MemoryRedis
+from subconscious.model import RedisModel
+from unittest import TestCase
+import asyncio
+
+
+class TestUser(RedisModel):
+    id = Column(primary_key=True)
+    name = Column(index=True, sort=True)
+
+
+class TestMemoryRedis(TestCase):
+    """Checks MemoryRedis against redis semantics directly, no server needed.
+    Run the whole suite with SUBCONSCIOUS_TEST_DB=memory to exercise it further.
+    """
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(None)
+        self.db = MemoryRedis()
+
+    def _run(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    def test_model_round_trip(self):
+        self._run(TestUser(id='1', name='john').save(self.db))
+        self._run(TestUser(id='2', name='alice').save(self.db))
+        self.assertEqual('john', self._run(TestUser.load(self.db, identifier='1')).name)
+
+        async def _test():
+            return [x.name async for x in TestUser.all(self.db, order_by='-name')]
+        self.assertEqual(['john', 'alice'], self._run(_test()))
+
+    def test_hashes(self):
+        self.assertTrue(self._run(self.db.hmset_dict('h', {'a': 1, 'b': 'x'})))
+        self.assertEqual({'a': '1', 'b': 'x'}, self._run(self.db.hgetall('h')))
+        self.assertEqual({}, self._run(self.db.hgetall('missing')))
+        self.assertEqual(0, self._run(self.db.hsetnx('h', 'a', 2)))
+        self.assertEqual(['1', None], self._run(self.db.hmget('h', 'a', 'c')))
+        self.assertEqual(2, self._run(self.db.hdel('h', 'a', 'b')))
+        self.assertEqual(0, self._run(self.db.exists('h')))
+
+    def test_lex_range(self):
+        self._run(self.db.zadd('z', 0, 'a\x001', 0, 'ab\x002', 0, 'b\x003', 0, 'é\x004'))
+        self.assertEqual(['ab\x002'], self._run(self.db.zrangebylex('z', min=b'ab\x00', max=b'ab\x00\xff')))
+        self.assertEqual(['b\x003', 'é\x004'], self._run(self.db.zrangebylex('z', min=b'ab\x002', include_min=False)))
+        self.assertEqual(['a\x001', 'ab\x002'], self._run(self.db.zrangebylex('z', max=b'b', include_max=False)))
+        self.assertEqual(['ab\x002'], self._run(self.db.zrangebylex('z', offset=1, count=1)))
+        self.assertEqual(2, self._run(self.db.zlexcount('z', min=b'a', max=b'a\xff')))
+
+    def test_score_range(self):
+        self._run(self.db.zadd('z', 3, 'c', 1, 'a', 2, 'b'))
+        self.assertEqual(['a', 'b', 'c'], self._run(self.db.zrange('z')))
+        self.assertEqual(['a', 'b'], self._run(self.db.zrangebyscore('z', max=2)))
+        self.assertEqual(['c'], self._run(self.db.zrangebyscore('z', min=2, exclude='ZSET_EXCLUDE_MIN')))
+        self.assertEqual(['b'], self._run(self.db.zrangebyscore('z', min=1, offset=1, count=1)))
+        self.assertEqual(2.0, self._run(self.db.zscore('z', 'b')))
+
+    def test_sort(self):
+        for i, name in enumerate(['b', 'c', 'a']):
+            self._run(self.db.hmset_dict('U:{}'.format(i), {'name': name, 'age': 10 - i}))
+        self._run(self.db.sadd('ids', 0, 1, 2))
+        self.assertEqual(['2', '0', '1'], self._run(self.db.sort('ids', by='U:*->name', alpha=True)))
+        self.assertEqual(['a', '8', 'c', '9'], self._run(self.db.sort(
+            'ids', 'U:*->name', 'U:*->age', by='U:*->age', offset=0, count=2)))
+        self.assertEqual(['2', '1', '0'], self._run(self.db.sort('ids', asc=b'DESC')))
+
+    def test_scan(self):
+        for i in range(25):
+            self._run(self.db.set('key:{}'.format(i), i))
+        self._run(self.db.set('other', 1))
+        keys = []
+
+        async def _test():
+            async for key in self.db.iscan(match='key:*', count=7):
+                keys.append(key)
+        self._run(_test())
+        self.assertEqual(sorted('key:{}'.format(i) for i in range(25)), sorted(keys))
+
+    def test_scan_while_writing(self):
+        originals = ['key:{:02}'.format(i) for i in range(25)]
+        for key in originals:
+            self._run(self.db.set(key, 1))
+        keys = []
+
+        async def _test():
+            async for key in self.db.iscan(match='key:*', count=7):
+                keys.append(key)
+                await self.db.delete(key)
+                await self.db.set('added:{}'.format(key), 1)
+                if len(keys) == 10:
+                    # a scan started meanwhile takes a new snapshot, this one carries on
+                    self.assertEqual(15, len([x async for x in self.db.iscan(match='key:*')]))
+        self._run(_test())
+        self.assertEqual(originals, sorted(keys))
+        self.assertEqual(0, self._run(self.db.exists(*originals)))
+
+    def test_wrong_type(self):
+        self._run(self.db.sadd('s', 'a'))
+        with self.assertRaises(ReplyError):
+            self._run(self.db.hgetall('s'))
+
+    def test_multi_exec(self):
+        async def _test():
+            tr = self.db.multi_exec()
+            fut1 = tr.incr('counter')
+            fut2 = tr.incr('counter')
+            self.assertEqual([1, 2], await tr.execute())
+            return await fut1, await fut2
+        self.assertEqual((1, 2), self._run(_test()))
+
+    def test_watch(self):
+        async def _test():
+            with await self.db as conn:
+                await conn.watch('counter')
+                await self.db.incr('counter')
+                tr = conn.multi_exec()
+                fut = tr.incr('counter')
+                with self.assertRaises(MultiExecError):
+                    await tr.execute()
+                with self.assertRaises(WatchVariableError):
+                    await fut
+                # EXEC forgot the watched keys
+                tr = conn.multi_exec()
+                tr.incr('counter')
+                return await tr.execute()
+        self.assertEqual([2], self._run(_test()))
+
+    def test_streams(self):
+        async def _test():
+            reader = asyncio.ensure_future(self.db.xread(['s'], timeout=1000))
+            await asyncio.sleep(0)
+            message_id = await self.db.xadd('s', {'a': 1})
+            self.assertEqual([('s', message_id, {'a': '1'})], await reader)
+            self.assertEqual([], await self.db.xread(['s'], timeout=1))
+
+            await self.db.xgroup_create('s', 'g', latest_id='0')
+            with self.assertRaises(ReplyError):
+                await self.db.xgroup_create('s', 'g')
+            messages = await self.db.xread_group('g', 'c', ['s'], latest_ids=['>'])
+            self.assertEqual([message_id], [x[1] for x in messages])
+            self.assertEqual(messages, await self.db.xread_group('g', 'c', ['s'], latest_ids=['0']))
+            self.assertEqual(1, await self.db.xack('s', 'g', message_id))
+            self.assertEqual([], await self.db.xread_group('g', 'c', ['s'], latest_ids=['0']))
+        self._run(_test())
@@ -0,0 +1,129 @@
+from subconscious.column import Column
+from subconscious.mirror import ModelMirror
+from subconscious.model import RedisModel, InvalidModelDefinition, InvalidQuery
+from .base import BaseTestCase
+import asyncio
+
+
+class TestCountry(RedisModel):
+    __change_stream__ = True
+
+    code = Column(primary_key=True)
+    name = Column(index=True)
+    population = Column(type=int, index=True)
+    region = Column(index=True, required=False)
+
+
+class TestNoStream(RedisModel):
+    id = Column(primary_key=True)
+
+
+COUNTRIES = [
+    dict(code='CAN', name='Canada', population=38, region='NA'),
+    dict(code='USA', name='United States', population=331, region='NA'),
+    dict(code='MEX', name='Mexico', population=128, region='NA'),
+    dict(code='FRA', name='France', population=67, region='EU'),
+    dict(code='AQ', name='Antarctica', population=0),
+]
+
+
+class TestMirror(BaseTestCase):
+    def setUp(self):
+        super(TestMirror, self).setUp()
+        for kwargs in COUNTRIES:
+            self._run(TestCountry(**kwargs).save(self.db))
+        self.mirror = ModelMirror(TestCountry, self.db, block_ms=10)
+        self._run(self.mirror.start())
+
+    def tearDown(self):
+        self._run(self.mirror.stop())
+        super(TestMirror, self).tearDown()
+
+    def _codes(self, **kwargs):
+        return self._ids(self.mirror.filter_by(**kwargs))
+
+    def test_load(self):
+        self.assertEqual(5, len(self.mirror))
+        country = self._run(self.mirror.load('FRA'))
+        self.assertEqual('France', country.name)
+        self.assertEqual(67, country.population)
+        self.assertIsNone(self._run(self.mirror.load('XXX')))
+
+    def test_loaded_objects_are_copies(self):
+        country = self._run(self.mirror.load('FRA'))
+        country.name = 'changed'
+        self.assertEqual('France', self._run(self.mirror.load('FRA')).name)
+
+    def test_filter_by(self):
+        self.assertEqual(['CAN', 'MEX', 'USA'], self._codes(region='NA'))
+        self.assertEqual(['CAN', 'USA'], self._codes(region='NA', population=[38, 331]))
+        self.assertEqual(['AQ'], self._codes(region=None))
+        self.assertEqual(['CAN', 'FRA', 'MEX'], self._codes(name__lt='Mz', name__gte='C'))
+        self.assertEqual(['USA'], self._codes(name__startswith='United'))
+
+    def test_order_by_limit_offset(self):
+        # stored strings are sorted, as redis does
+        self.assertEqual(['FRA', 'CAN', 'USA', 'MEX', 'AQ'], self._codes(order_by='-population'))
+        self.assertEqual(['CAN', 'USA'], self._codes(order_by='-population', offset=1, limit=2))
+        self.assertEqual(['AQ', 'CAN', 'FRA'], self._codes(order_by='name', limit=3))
+
+    def test_same_order_as_redis(self):
+        regions = {x['code']: x.get('region') for x in COUNTRIES}
+        for order_by in ['population', '-population', 'name', '-region', 'region']:
+            expected = self._ids(TestCountry.filter_by(self.db, order_by=order_by))
+            if order_by.endswith('region'):
+                # redis returns equal values in any order
+                self.assertEqual([regions[x] for x in expected], [regions[x] for x in self._codes(order_by=order_by)])
+            else:
+                self.assertEqual(expected, self._codes(order_by=order_by))
+
+    def test_bad_query_should_fail(self):
+        with self.assertRaises(InvalidQuery):
+            self._codes(nope=1)
+        with self.assertRaises(InvalidQuery):
+            self._codes(order_by='nope')
+
+    def test_follows_changes(self):
+        async def _test():
+            country = await TestCountry.load(self.db, identifier='FRA')
+            country.population = 68
+            await country.save(self.db)
+            await TestCountry(code='DEU', name='Germany', population=83, region='EU').save(self.db)
+            await (await TestCountry.load(self.db, identifier='CAN')).delete(self.db)
+            # give the background follower a chance to read the stream
+            for _ in range(10):
+                await asyncio.sleep(0.01)
+                if len(self.mirror) == 5 and (await self.mirror.load('FRA')).population == 68:
+                    break
+        self._run(_test())
+        self.assertEqual(68, self._run(self.mirror.load('FRA')).population)
+        self.assertIsNone(self._run(self.mirror.load('CAN')))
+        self.assertEqual(['DEU', 'FRA'], self._codes(region='EU'))
+        self.assertEqual(['MEX', 'USA'], self._codes(region='NA'))
+
+    def test_sync_and_resync(self):
+        self._run(self.mirror.stop())
+        self._run(TestCountry(code='DEU', name='Germany', population=83, region='EU').save(self.db))
+        self.assertIsNone(self._run(self.mirror.load('DEU')))
+        self._run(self.mirror.sync())
+        self.assertEqual('Germany', self._run(self.mirror.load('DEU')).name)
+        self._run(self.mirror.resync())
+        self.assertEqual(6, len(self.mirror))
+
+    def test_resyncs_after_falling_behind_the_stream_cap(self):
+        self._run(self.mirror.stop())
+        TestCountry.__change_stream_maxlen__ = 10
+        try:
+            # more than a stream node, so redis trims changes the mirror never read
+            for i in range(250):
+                self._run(TestCountry(code='X{:03}'.format(i), name='x', population=i).save(self.db))
+        finally:
+            TestCountry.__change_stream_maxlen__ = 10000
+        self.assertLess(self._command('xlen', TestCountry.get_stream_key()), 150)
+        self._run(self.mirror.sync())
+        self.assertEqual(255, len(self.mirror))
+        self.assertEqual(0, self._run(self.mirror.load('X000')).population)
+
+    def test_model_without_stream_should_fail(self):
+        with self.assertRaises(InvalidModelDefinition):
+            ModelMirror(TestNoStream, self.db)
@@ -0,0 +1,89 @@
+from subconscious.column import Column
+from subconscious.model import RedisModel, InvalidQuery
+from .base import BaseTestCase
+import asyncio
+
+
+class TestItem(RedisModel):
+    id = Column(primary_key=True)
+    name = Column(index=True)
+    kind = Column(index=True)
+
+    in_flight = 0
+    max_in_flight = 0
+    # when set to an asyncio.Event, loads after the first one wait for it
+    gate = None
+    cancelled = []
+
+    @classmethod
+    async def load(cls, db, identifier=None, **kwargs):
+        cls.in_flight += 1
+        cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+        try:
+            await asyncio.sleep(0.001)
+            if cls.gate is not None and identifier != '00':
+                await cls.gate.wait()
+            return await super(TestItem, cls).load(db, identifier=identifier, **kwargs)
+        except asyncio.CancelledError:
+            cls.cancelled.append(identifier)
+            raise
+        finally:
+            cls.in_flight -= 1
+
+
+class TestPrefetch(BaseTestCase):
+
+    def setUp(self):
+        super(TestPrefetch, self).setUp()
+        for i in range(20):
+            self._run(TestItem(id='{:02}'.format(i), name='n{:02}'.format(i), kind='k{}'.format(i % 2)).save(self.db))
+        TestItem.max_in_flight = 0
+        TestItem.cancelled = []
+
+    def _ids(self, **kwargs):
+        return super(TestPrefetch, self)._ids(TestItem.filter_by(self.db, **kwargs))
+
+    def test_same_results_in_order(self):
+        for kwargs in [dict(kind='k1'), dict(order_by='-name', limit=5, offset=2), dict(name__gte='n15')]:
+            expected = self._ids(**kwargs)
+            self.assertEqual(expected, self._ids(prefetch=4, **kwargs))
+
+    def test_read_ahead_is_bounded(self):
+        self._ids(order_by='name')
+        self.assertEqual(1, TestItem.max_in_flight)
+
+        async def _test():
+            ids = []
+            async for x in TestItem.query(self.db).order_by('name').prefetch(5):
+                # slow consumer, the window fills up but stays bounded
+                await asyncio.sleep(0.002)
+                ids.append(x.id)
+            return ids
+        self.assertEqual(['{:02}'.format(i) for i in range(20)], self._run(_test()))
+        self.assertEqual(6, TestItem.max_in_flight)
+
+    def test_stream_path_prefetch(self):
+        self.assertEqual(['{:02}'.format(i) for i in range(10)], self._ids(name__lt='n10', prefetch=3))
+        self.assertEqual(4, TestItem.max_in_flight)
+
+    def test_stopping_early_cancels_pending_loads(self):
+        async def _test(results):
+            # the loads read ahead never finish unless they are cancelled
+            TestItem.gate = asyncio.Event()
+            first = await results.__anext__()
+            self.assertEqual(5, TestItem.in_flight)
+            await results.aclose()
+            await asyncio.sleep(0.01)
+            return first.id
+        try:
+            for results in [TestItem.all(self.db, prefetch=5), TestItem.filter_by(self.db, name__gte='n', prefetch=5)]:
+                TestItem.cancelled = []
+                self.assertEqual('00', self._run(_test(results)))
+                self.assertEqual(['01', '02', '03', '04', '05'], sorted(TestItem.cancelled))
+                self.assertEqual(0, TestItem.in_flight)
+        finally:
+            TestItem.gate = None
+
+    def test_bad_prefetch_should_fail(self):
+        with self.assertRaises(InvalidQuery):
+            self._ids(prefetch='3')
@@ -0,0 +1,100 @@
+from subconscious.column import Column, InvalidColumnDefinition
+from subconscious.expiry import reap_expired
+from subconscious.model import RedisModel, InvalidQuery
+from .base import BaseTestCase
+import time
+
+
+class TestContact(RedisModel):
+    __ttl__ = 60
+
+    id = Column(primary_key=True)
+    name = Column(search=True)
+    company = Column(search=True, required=False)
+    country_code = Column(index=True)
+
+
+class TestPlain(RedisModel):
+    id = Column(primary_key=True)
+
+
+class TestEngine(RedisModel):
+    id = Column(primary_key=True)
+    name = Column(search=True)
+    search = Column(index=True)
+
+
+CONTACTS = [
+    dict(id='1', name='John Doe', company='Acme, Inc.', country_code='USA'),
+    dict(id='2', name='Jane Doe', company='Globex', country_code='CAN'),
+    dict(id='3', name='john smith', country_code='USA'),
+]
+
+
+class TestSearch(BaseTestCase):
+
+    def setUp(self):
+        super(TestSearch, self).setUp()
+        for kwargs in CONTACTS:
+            self._run(TestContact(**kwargs).save(self.db))
+
+    def _search(self, text, **kwargs):
+        return self._ids(TestContact.query(self.db).search(text).filter(**kwargs))
+
+    def test_search(self):
+        self.assertEqual(['1', '3'], self._search('JOHN'))
+        self.assertEqual(['1'], self._search('john doe'))
+        self.assertEqual(['1', '2'], self._search('doe'))
+        self.assertEqual(['1'], self._search('acme'))
+        self.assertEqual([], self._search('john globex'))
+        self.assertEqual([], self._search('nobody'))
+        self.assertEqual([], self._search(' ,. '))
+
+    def test_composes_with_filters(self):
+        self.assertEqual(['2'], self._search('doe', country_code='CAN'))
+        self.assertEqual(['3', '1'], self._ids(TestContact.filter_by(
+            self.db, _search='john', country_code='USA', order_by='-id')))
+        self.assertEqual(2, self._run(TestContact.query(self.db).search('doe').count()))
+
+    def test_update_and_delete_clean_up_tokens(self):
+        contact = self._run(TestContact.load(self.db, identifier='1'))
+        contact.name = 'Johnny Roe'
+        self._run(contact.save(self.db))
+        self.assertEqual(['3'], self._search('john'))
+        self.assertEqual(['1'], self._search('johnny acme'))
+        self.assertEqual(['3'], self._command('smembers', TestContact.get_search_key('john')))
+        self.assertEqual(['2'], self._search('doe'))
+
+        self._run(contact.delete(self.db))
+        self.assertEqual([], self._search('johnny'))
+        self.assertEqual(0, self._command('exists', TestContact.get_search_key('acme')))
+
+    def test_save_only_writes_changed_tokens(self):
+        self._command('delete', TestContact.get_search_key('doe'))
+        contact = self._run(TestContact.load(self.db, identifier='1'))
+        contact.country_code = 'CAN'
+        self._run(contact.save(self.db))
+        # the text didn't change, so its words weren't added again
+        self.assertEqual(0, self._command('exists', TestContact.get_search_key('doe')))
+        contact.company = 'Acme Corp'
+        self._run(contact.save(self.db))
+        self.assertEqual(0, self._command('exists', TestContact.get_search_key('doe')))
+        self.assertEqual(['1'], self._search('john corp'))
+        self.assertEqual([], self._search('inc'))
+
+    def test_reaper_cleans_up_tokens(self):
+        self._run(reap_expired(self.db, TestContact, now=time.time() + 61))
+        self.assertEqual(0, self._command('exists', TestContact.get_search_key('doe')))
+
+    def test_column_named_search(self):
+        self._run(TestEngine(id='1', name='Big Query', search='sql').save(self.db))
+        self._run(TestEngine(id='2', name='Small Query', search='text').save(self.db))
+        self.assertEqual(['2'], self._ids(TestEngine.filter_by(self.db, search='text')))
+        self.assertEqual(['1'], self._ids(TestEngine.query(self.db).search('query').filter(search='sql')))
+        self.assertEqual({'sql': 1, 'text': 1}, self._run(TestEngine.query(self.db).group_by('search').count()))
+
+    def test_bad_search_should_fail(self):
+        with self.assertRaises(InvalidColumnDefinition):
+            Column(type=int, search=True)
+        with self.assertRaises(InvalidQuery):
+            self._ids(TestPlain.filter_by(self.db, _search='x'))
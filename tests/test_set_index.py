@@ -0,0 +1,88 @@
+from datetime import datetime
+from subconscious.column import Column, InvalidColumnDefinition, SET_INDEX
+from subconscious.model import RedisModel
+from uuid import uuid1
+from .base import BaseTestCase
+
+
+class TestUser(RedisModel):
+    id = Column(primary_key=True)
+    name = Column(index=True)
+    email = Column(index=True, index_type=SET_INDEX)
+    country_code = Column(index=True, index_type=SET_INDEX)
+
+
+class TestShift(RedisModel):
+    id = Column(primary_key=True)
+    start = Column(type=datetime, index=True, index_type=SET_INDEX)
+
+
+class TestSetIndex(BaseTestCase):
+    def setUp(self):
+        super(TestSetIndex, self).setUp()
+        for i, country_code in enumerate(('USA', 'USA', 'CAN')):
+            user = TestUser(
+                id=str(uuid1()),
+                name='name-{}'.format(i),
+                email='user{}@example.com'.format(i),
+                country_code=country_code,
+            )
+            self.loop.run_until_complete(user.save(self.db))
+
+    def _filter_by(self, **kwargs):
+        async def _test():
+            return [x async for x in TestUser.filter_by(self.db, **kwargs)]
+        return self.loop.run_until_complete(_test())
+
+    def test_filter_by_set_index(self):
+        self.assertEqual(['user1@example.com'], [x.email for x in self._filter_by(email='user1@example.com')])
+        self.assertEqual(2, len(self._filter_by(country_code='USA')))
+        self.assertEqual(3, len(self._filter_by(country_code=['USA', 'CAN'])))
+        self.assertEqual([], self._filter_by(country_code='MEX'))
+
+    def test_filter_by_set_and_lex_index(self):
+        result = self._filter_by(country_code='USA', email='user0@example.com')
+        self.assertEqual(['name-0'], [x.name for x in result])
+
+        result = self._filter_by(country_code='USA', name='name-2')
+        self.assertEqual([], result)
+
+    def test_update_moves_set_index_entry(self):
+        user = self._filter_by(country_code='CAN')[0]
+        user.country_code = 'USA'
+        self.loop.run_until_complete(user.save(self.db))
+        self.assertEqual([], self._filter_by(country_code='CAN'))
+        self.assertEqual(3, len(self._filter_by(country_code='USA')))
+
+    def test_datetime_values(self):
+        whole, fraction = datetime(2020, 1, 1), datetime(2020, 1, 1, 0, 0, 0, 500)
+
+        def _ids(**kwargs):
+            return self._ids(TestShift.filter_by(self.db, **kwargs))
+        self._run(TestShift(id='1', start=whole).save(self.db))
+        self._run(TestShift(id='2', start=fraction).save(self.db))
+        self.assertEqual(['1'], _ids(start=whole))
+        self.assertEqual(['2'], _ids(start=fraction))
+
+        shift = self._run(TestShift.load(self.db, identifier='1'))
+        shift.start = fraction
+        self._run(shift.save(self.db))
+        self.assertEqual([], _ids(start=whole))
+        self.assertEqual(['1', '2'], sorted(_ids(start=fraction)))
+        # the value registry dropped the value nobody has any more
+        self.assertEqual(
+            [TestShift._index_value(fraction)],
+            self._command('smembers', TestShift.get_set_index_values_key('start')),
+        )
+
+    def test_set_index_requires_index(self):
+        with self.assertRaises(InvalidColumnDefinition):
+            Column(index_type=SET_INDEX)
+
+    def test_set_index_on_primary_key_should_fail(self):
+        with self.assertRaises(InvalidColumnDefinition):
+            Column(primary_key=True, index=True, index_type=SET_INDEX)
+
+    def test_bad_index_type_should_fail(self):
+        with self.assertRaises(InvalidColumnDefinition):
+            Column(index=True, index_type='btree')
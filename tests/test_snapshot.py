@@ -0,0 +1,70 @@
+from subconscious.column import Column, Integer, SET_INDEX
+from subconscious.model import RedisModel
+from subconscious.snapshot import export, import_, rebuild_index
+from .base import BaseTestCase
+import io
+
+
+class TestMember(RedisModel):
+    id = Integer(primary_key=True, auto_increment=True)
+    name = Column(index=True, sort=True)
+    email = Column(unique=True)
+    team = Column(index=True, index_type=SET_INDEX)
+    age = Column(type=int, required=False)
+
+
+class TestSnapshot(BaseTestCase):
+
+    def setUp(self):
+        super(TestSnapshot, self).setUp()
+        for i, name in enumerate(['ann', 'bob', 'cid', 'dee', 'eve']):
+            member = TestMember(name=name, email='{}@x.com'.format(name), team='t{}'.format(i % 2), age=20 + i)
+            self._run(member.save(self.db))
+
+    def _names(self, **kwargs):
+        async def _test():
+            return [x.name async for x in TestMember.filter_by(self.db, **kwargs)]
+        return self._run(_test())
+
+    def _export_and_clear(self):
+        stream = io.StringIO()
+        self.assertEqual(5, self._run(export(self.db, TestMember, stream, batch_size=2)))
+
+        async def delete_all():
+            async for k in self.db.iscan(match='*TestMember*'):
+                await self.db.delete(k)
+        self._run(delete_all())
+        stream.seek(0)
+        return stream
+
+    def test_round_trip(self):
+        stream = self._export_and_clear()
+        self.assertEqual([], self._names())
+        self.assertEqual(5, self._run(import_(self.db, TestMember, stream, batch_size=2)))
+
+        member = self._run(TestMember.load(self.db, identifier=3))
+        self.assertEqual(('cid', 22), (member.name, member.age))
+        self.assertEqual(['ann', 'cid', 'eve'], self._names(team='t0', order_by='name'))
+        self.assertEqual(['dee'], self._names(name__startswith='d'))
+        self.assertEqual('bob', self._run(TestMember.get_by_unique(self.db, email='bob@x.com')).name)
+
+    def test_auto_increment_continues_after_import(self):
+        stream = self._export_and_clear()
+        self._run(import_(self.db, TestMember, stream))
+        member = TestMember(name='fay', email='fay@x.com', team='t0')
+        self._run(member.save(self.db))
+        self.assertEqual(6, member.id)
+
+    def test_deferred_index(self):
+        stream = self._export_and_clear()
+        self._run(import_(self.db, TestMember, stream, build_index=False))
+        self.assertEqual([], self._names(team='t1'))
+        self.assertEqual(5, self._run(rebuild_index(self.db, TestMember, batch_size=3)))
+        self.assertEqual(['bob', 'dee'], self._names(team='t1', order_by='name'))
+
+    def test_export_format(self):
+        stream = io.StringIO()
+        self._run(export(self.db, TestMember, stream))
+        lines = sorted(stream.getvalue().splitlines())
+        self.assertEqual(5, len(lines))
+        self.assertIn('"name": "ann"', lines[0])
@@ -0,0 +1,86 @@
+from aioredis import ReplyError
+from subconscious.column import Column, InvalidColumnDefinition, SET_INDEX
+from subconscious.model import RedisModel, InvalidQuery, UniqueConstraintError
+from unittest import mock
+from .base import BaseTestCase
+
+
+class TestUser(RedisModel):
+    id = Column(primary_key=True)
+    name = Column(index=True)
+    email = Column(unique=True)
+    handle = Column(unique=True, required=False)
+
+
+class TestUnique(BaseTestCase):
+    def setUp(self):
+        super(TestUnique, self).setUp()
+        for i in range(3):
+            user = TestUser(id=str(i), name='name-{}'.format(i), email='user{}@example.com'.format(i))
+            self.loop.run_until_complete(user.save(self.db))
+
+    def test_get_by_unique(self):
+        user = self.loop.run_until_complete(TestUser.get_by_unique(self.db, email='user1@example.com'))
+        self.assertEqual(TestUser, type(user))
+        self.assertEqual('1', user.id)
+
+        user = self.loop.run_until_complete(TestUser.get_by_unique(self.db, email='nobody@example.com'))
+        self.assertIsNone(user)
+
+    def test_get_by_unique_with_dangling_index_entry(self):
+        self._command('hset', TestUser.get_index_key('email'), 'gone@example.com', '9')
+        self.assertIsNone(self._run(TestUser.get_by_unique(self.db, email='gone@example.com')))
+
+    def test_get_by_unique_without_scripting(self):
+        no_eval = ReplyError("ERR unknown command 'EVAL'")
+        with mock.patch.object(type(self.db), 'eval', side_effect=no_eval):
+            self.assertEqual('2', self._run(TestUser.get_by_unique(self.db, email='user2@example.com')).id)
+            self.assertIsNone(self._run(TestUser.get_by_unique(self.db, email='nobody@example.com')))
+
+    def test_get_by_unique_bad_query_should_fail(self):
+        with self.assertRaises(InvalidQuery):
+            self.loop.run_until_complete(TestUser.get_by_unique(self.db, name='name-1'))
+        with self.assertRaises(InvalidQuery):
+            self.loop.run_until_complete(TestUser.get_by_unique(self.db, email='a', handle='b'))
+
+    def test_duplicate_should_fail(self):
+        user = TestUser(id='3', name='name-3', email='user1@example.com')
+        with self.assertRaises(UniqueConstraintError):
+            self.loop.run_until_complete(user.save(self.db))
+        self.assertIsNone(self.loop.run_until_complete(TestUser.load(self.db, identifier='3')))
+
+    def test_failed_save_releases_claimed_values(self):
+        user = TestUser(id='3', name='name-3', email='user1@example.com', handle='fresh')
+        with self.assertRaises(UniqueConstraintError):
+            self.loop.run_until_complete(user.save(self.db))
+
+        user = TestUser(id='4', name='name-4', email='user4@example.com', handle='fresh')
+        self.loop.run_until_complete(user.save(self.db))
+        user = self.loop.run_until_complete(TestUser.get_by_unique(self.db, handle='fresh'))
+        self.assertEqual('4', user.id)
+
+    def test_update_releases_old_value(self):
+        user = self.loop.run_until_complete(TestUser.load(self.db, identifier='1'))
+        # re-saving with the same value is not a duplicate
+        self.loop.run_until_complete(user.save(self.db))
+
+        user.email = 'changed@example.com'
+        self.loop.run_until_complete(user.save(self.db))
+        self.assertIsNone(self.loop.run_until_complete(TestUser.get_by_unique(self.db, email='user1@example.com')))
+        user = self.loop.run_until_complete(TestUser.get_by_unique(self.db, email='changed@example.com'))
+        self.assertEqual('1', user.id)
+
+        # the old value is free for someone else
+        user = TestUser(id='3', name='name-3', email='user1@example.com')
+        self.loop.run_until_complete(user.save(self.db))
+
+    def test_filter_by_unique(self):
+        async def _test():
+            return [x.id async for x in TestUser.filter_by(self.db, email=['user0@example.com', 'user2@example.com'])]
+        self.assertEqual(['0', '2'], self.loop.run_until_complete(_test()))
+
+    def test_bad_unique_definitions_should_fail(self):
+        with self.assertRaises(InvalidColumnDefinition):
+            Column(primary_key=True, unique=True)
+        with self.assertRaises(InvalidColumnDefinition):
+            Column(unique=True, index=True, index_type=SET_INDEX)